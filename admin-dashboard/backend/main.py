@@ -1,21 +1,49 @@
+import asyncio
 import logging
 import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional
 
 from bson import ObjectId
 from fastapi import FastAPI, APIRouter, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel
 from pymongo import DESCENDING
 
-from mongo import submissions_collection
+import mongo
+from moderation import ModerationError, canonical_id, moderate
+from shared import metrics, profiling
+from shared.indexes import ensure_indexes_async
+from shared.serializers import ADMIN_FEED_FIELDS, projection, serialize_submission
+
+logger = logging.getLogger("uvicorn")
+
+
+async def _bootstrap_indexes():
+    try:
+        await ensure_indexes_async(mongo.db)
+    except Exception as e:
+        logger.error(f"Index bootstrap failed: {str(e)}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing here waits on MongoDB; the client connects on first use
+    index_task = asyncio.create_task(_bootstrap_indexes())
+    yield
+    index_task.cancel()
+    await mongo.close()
+
 
 app = FastAPI(
     docs_url=None,
     redoc_url=None,
-    openapi_url=None
+    openapi_url=None,
+    lifespan=lifespan
 )
 
-logger = logging.getLogger("uvicorn")
 api_router = APIRouter()
 
 ENVIRONMENT = os.getenv("ENVIRONMENT", "")
@@ -28,8 +56,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+metrics.instrument(app)
+profiling.instrument(app, prefix="/api/admin")
 
 # Assuming submissions_collection is your MongoDB collection
+@api_router.get("/ready", response_class=JSONResponse)
+async def ready():
+    # Readiness probe: only report ready while MongoDB answers a ping
+    if not await mongo.ping():
+        return JSONResponse(status_code=503, content={"status": "unavailable", "mongo": False})
+    return {"status": "ok", "mongo": True}
+
+
 @api_router.get("/images")
 async def get_images(
         limit: int = 5,
@@ -57,21 +95,17 @@ async def get_images(
                     ]
                 }
 
-        cursor = submissions_collection.find(query_filter).sort(sort_fields).limit(limit)
+        cursor = (
+            mongo.submissions_collection.find(query_filter, projection(ADMIN_FEED_FIELDS))
+            .sort(sort_fields)
+            .limit(limit)
+        )
         images_data = []
         last_id = None
         last_likes = None
 
-        for doc in cursor:
-            image_data = {
-                "submission_id": str(doc["_id"]),
-                "image_url": doc.get("image_url", ""),
-                "thumbnail_url": doc.get("thumbnail_url", ""),
-                "timestamp": doc.get("timestamp").isoformat() if doc.get("timestamp") else "",
-                "likes": doc.get("likes", 0),
-                "username": doc.get("username", "unknown")
-            }
-            images_data.append(image_data)
+        async for doc in cursor:
+            images_data.append(serialize_submission(doc, ADMIN_FEED_FIELDS))
             last_id = str(doc["_id"])
             last_likes = doc.get("likes", 0) if sort == "likes" else None
 
@@ -82,36 +116,49 @@ async def get_images(
             if sort == "likes":
                 response["next_start_after_likes"] = last_likes
 
-        return JSONResponse(content=response)
+        return ORJSONResponse(content=response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching images: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch images: {str(e)}")
 
 
-@api_router.delete("/delete")
-async def delete_submission(submission_id: str):
-    try:
-        # Convert the submission_id to an ObjectId
-        try:
-            obj_id = ObjectId(submission_id)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail="Invalid submission_id format.")
-
-        # Query the database to find the submission
-        submission = submissions_collection.find_one({"_id": obj_id})
+class ModerationRequest(BaseModel):
+    action: str = "delete"
+    ids: Optional[list[str]] = None
+    username: Optional[str] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
 
-        if not submission:
-            raise HTTPException(status_code=404, detail="Submission not found.")
 
-        # Delete the submission from the database
-        submissions_collection.delete_one({"_id": obj_id})
+# Delete, hide or unhide many submissions at once
+@api_router.post("/moderate")
+async def moderate_submissions(request: ModerationRequest):
+    try:
+        result = await moderate(request.action, request.ids, request.username, request.start, request.end)
+        return ORJSONResponse(content=result)
+    except ModerationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error moderating submissions: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to moderate submissions: {str(e)}")
 
-        # Return a success response
-        return JSONResponse(content={"status": "success", "message": "Submission deleted successfully"})
 
+@api_router.delete("/delete")
+async def delete_submission(submission_id: str):
+    try:
+        result = await moderate("delete", ids=[submission_id])
     except Exception as e:
         logger.error(f"Error deleting submission: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to delete submission: {str(e)}")
 
+    status = result["results"][canonical_id(submission_id) or submission_id]["status"]
+    if status == "invalid_id":
+        raise HTTPException(status_code=400, detail="Invalid submission_id format.")
+    if status == "not_found":
+        raise HTTPException(status_code=404, detail="Submission not found.")
+    return JSONResponse(content={"status": "success", "message": "Submission deleted successfully"})
+
 app.include_router(api_router, prefix="/api/admin")
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+
+from bson import ObjectId
+
+import mongo
+from storage import object_keys, remove_objects
+
+logger = logging.getLogger("uvicorn")
+
+# Upper bound on submissions touched by one request
+MODERATION_MAX_BATCH = int(os.getenv("MODERATION_MAX_BATCH", "5000"))
+
+ACTIONS = ("delete", "hide", "unhide")
+
+_FIELDS = {"object_keys": 1, "renditions": 1, "image_url": 1, "thumbnail_url": 1}
+
+
+class ModerationError(ValueError):
+    pass
+
+
+def canonical_id(submission_id: str):
+    """The id as str(ObjectId), whatever its case or surrounding whitespace; None if it is not an ObjectId."""
+    try:
+        return str(ObjectId(submission_id.strip()))
+    except Exception:
+        return None
+
+
+def build_query(ids=None, username: str = None, start: datetime = None, end: datetime = None):
+    """Mongo filter for the selection, plus per-id results for ids that are not valid ObjectIds.
+
+    Valid ids are de-duplicated by their canonical form, which also keys their results.
+    """
+    invalid = {}
+    query = {}
+    if ids is not None:
+        obj_ids = {}
+        for submission_id in ids:
+            canonical = canonical_id(submission_id)
+            if canonical is None:
+                invalid[submission_id] = {"status": "invalid_id"}
+            else:
+                obj_ids.setdefault(canonical, ObjectId(canonical))
+        query["_id"] = {"$in": list(obj_ids.values())}
+    if username:
+        query["username"] = username
+    if start is not None or end is not None:
+        query["timestamp"] = {}
+        if start is not None:
+            query["timestamp"]["$gte"] = start
+        if end is not None:
+            query["timestamp"]["$lt"] = end
+
+    # Never let an empty selection match the whole collection
+    if not query:
+        raise ModerationError("Select submissions by ids, username or time range.")
+    return query, invalid
+
+
+async def moderate(action: str, ids=None, username: str = None, start: datetime = None,
+                   end: datetime = None) -> dict:
+    """Apply action to every selected submission in one round trip.
+
+    Returns {"results": {submission_id: {...}}, "matched": n, "truncated": bool}, keyed
+    by canonical_id() for valid ids and by the id as given for invalid ones.
+    Deleting also removes the submission's MinIO objects in batched requests.
+    """
+    if action not in ACTIONS:
+        raise ModerationError(f"Invalid action. Must be one of: {', '.join(ACTIONS)}.")
+    query, results = build_query(ids, username, start, end)
+
+    docs = await mongo.submissions_collection.find(query, _FIELDS).limit(MODERATION_MAX_BATCH + 1).to_list()
+    truncated = len(docs) > MODERATION_MAX_BATCH
+    docs = docs[:MODERATION_MAX_BATCH]
+    found = [doc["_id"] for doc in docs]
+
+    if ids is not None:
+        found_ids = {str(obj_id) for obj_id in found}
+        for obj_id in query["_id"]["$in"]:
+            if str(obj_id) not in found_ids:
+                results[str(obj_id)] = {"status": "not_found"}
+
+    if found:
+        selection = {"_id": {"$in": found}}
+        if action == "delete":
+            await mongo.submissions_collection.delete_many(selection)
+            await _remove_objects(docs, results)
+        elif action == "hide":
+            await mongo.submissions_collection.update_many(
+                selection, {"$set": {"hidden": True, "hidden_at": datetime.utcnow()}}
+            )
+        else:
+            await mongo.submissions_collection.update_many(selection, {"$unset": {"hidden": "", "hidden_at": ""}})
+
+    status = {"delete": "deleted", "hide": "hidden", "unhide": "visible"}[action]
+    for obj_id in found:
+        results.setdefault(str(obj_id), {"status": status})
+
+    logger.info(f"Moderation: {action} applied to {len(found)} submission(s)")
+    return {"results": results, "matched": len(found), "truncated": truncated}
+
+
+async def _remove_objects(docs: list, results: dict):
+    keys_by_id = {str(doc["_id"]): object_keys(doc) for doc in docs}
+    all_keys = [key for keys in keys_by_id.values() for key in keys]
+    if not all_keys:
+        return
+
+    failed = await asyncio.to_thread(remove_objects, all_keys)
+    if failed:
+        logger.error(f"Moderation: {len(failed)} of {len(all_keys)} object(s) could not be removed")
+    for submission_id, keys in keys_by_id.items():
+        errors = [f"{bucket}/{key}: {failed[(bucket, key)]}" for bucket, key in keys if (bucket, key) in failed]
+        results[submission_id] = {"status": "deleted", "objects_removed": len(keys) - len(errors)}
+        if errors:
+            results[submission_id]["object_errors"] = errors
@@ -0,0 +1,253 @@
+"""Reconcile the image bucket with the submissions collection.
+
+Finds orphans (objects no submission references), dangling submissions
+(documents whose full-size image is missing) and submissions missing only
+other renditions (thumbnail, fallbacks), in bounded memory: the bucket listing
+is streamed in chunks that are looked up with one indexed $in query each,
+and submissions are paged by _id with their objects checked by stat_object.
+
+Run inside the admin backend container:
+    python -m reconciler             # dry run, report only
+    python -m reconciler --delete    # also delete orphans and dangling documents
+
+Submissions missing only secondary renditions still have a working image;
+they are reported, never deleted.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from urllib.parse import urlparse
+
+from minio.error import S3Error
+from pymongo import ASCENDING
+
+from shared import metrics
+from shared.db import get_db
+from storage import MINIO_BUCKET_NAME, minio_client, remove_objects
+
+logger = logging.getLogger("uvicorn")
+
+RECONCILE_CHUNK_SIZE = int(os.getenv("RECONCILE_CHUNK_SIZE", "1000"))
+# Objects younger than this may belong to a submission that is still being saved
+RECONCILE_GRACE_SECONDS = int(os.getenv("RECONCILE_GRACE_SECONDS", "3600"))
+# Storage requests per second (listing pages, stats and delete batches); 0 disables the limit
+RECONCILE_RATE = float(os.getenv("RECONCILE_RATE", "50"))
+RECONCILE_PARALLEL = int(os.getenv("RECONCILE_PARALLEL", "8"))
+REPORT_SAMPLE_SIZE = 20
+
+
+class RateLimiter:
+    """Token bucket shared by all worker threads."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def primary_key(doc: dict, bucket: str):
+    """Key of the full-size image in bucket, or None if it cannot be told."""
+    key = ((doc.get("renditions") or {}).get("full") or {}).get("key")
+    if key:
+        return key
+    # Older submissions only recorded URLs of the form .../<bucket>/<key>
+    parts = urlparse(doc.get("image_url") or "").path.lstrip("/").split("/", 1)
+    if len(parts) == 2 and parts[0] == bucket and parts[1]:
+        return parts[1]
+    return None
+
+
+def _chunks(iterable, size: int):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Reconciler:
+    def __init__(self, bucket: str = MINIO_BUCKET_NAME, delete: bool = False, rate: float = RECONCILE_RATE,
+                 parallel: int = RECONCILE_PARALLEL, grace_seconds: int = RECONCILE_GRACE_SECONDS,
+                 chunk_size: int = RECONCILE_CHUNK_SIZE):
+        self.bucket = bucket
+        self.delete = delete
+        self.chunk_size = chunk_size
+        self.grace = timedelta(seconds=grace_seconds)
+        self.limiter = RateLimiter(rate)
+        self.parallel = parallel
+        self.submissions = get_db().submissions
+        self.report = {
+            "bucket": bucket,
+            "dry_run": not delete,
+            "objects_scanned": 0,
+            "orphans": 0,
+            "orphan_bytes": 0,
+            "orphans_in_grace": 0,
+            "documents_scanned": 0,
+            "documents_without_keys": 0,
+            "dangling": 0,
+            "missing_renditions": 0,
+            "deleted_objects": 0,
+            "deleted_documents": 0,
+            "failed_deletes": 0,
+            "orphan_sample": [],
+            "dangling_sample": [],
+            "missing_renditions_sample": [],
+        }
+
+    def _exists(self, key: str) -> bool:
+        self.limiter.acquire()
+        try:
+            with metrics.time_storage("stat_object"):
+                minio_client.stat_object(self.bucket, key)
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                return False
+            raise
+
+    def _remove(self, keys: list):
+        self.limiter.acquire()
+        failed = remove_objects([(self.bucket, key) for key in keys])
+        return len(keys) - len(failed), len(failed)
+
+    def _delete_objects(self, executor, keys: list) -> list:
+        return [executor.submit(self._remove, keys)] if keys else []
+
+    def _collect(self, futures: list):
+        for future in futures:
+            removed, failed = future.result()
+            self.report["deleted_objects"] += removed
+            self.report["failed_deletes"] += failed
+
+    def find_dangling(self, executor):
+        """Page through submissions by _id; yield (submission, missing keys, primary missing) per chunk."""
+        last_id = None
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            docs = list(
+                self.submissions.find(query, {"object_keys": 1, "renditions.full.key": 1, "image_url": 1})
+                .sort("_id", ASCENDING)
+                .limit(self.chunk_size)
+            )
+            if not docs:
+                return
+            last_id = docs[-1]["_id"]
+            self.report["documents_scanned"] += len(docs)
+
+            keys = sorted({key for doc in docs for key in doc.get("object_keys") or []})
+            exists = dict(zip(keys, executor.map(self._exists, keys)))
+            chunk = []
+            for doc in docs:
+                if "object_keys" not in doc:
+                    self.report["documents_without_keys"] += 1
+                    continue
+                missing = [key for key in doc["object_keys"] if not exists[key]]
+                if missing:
+                    chunk.append((doc, missing, primary_key(doc, self.bucket) in missing))
+            yield chunk
+
+    def find_orphans(self):
+        """Stream the bucket listing; yield the unreferenced objects of each chunk."""
+        cutoff = datetime.now(timezone.utc) - self.grace
+        listing = minio_client.list_objects(self.bucket, recursive=True)
+        for chunk in _chunks(listing, self.chunk_size):
+            self.limiter.acquire()  # one listing page
+            self.report["objects_scanned"] += len(chunk)
+            names = [obj.object_name for obj in chunk]
+            referenced = set()
+            for doc in self.submissions.find({"object_keys": {"$in": names}}, {"object_keys": 1}):
+                referenced.update(doc["object_keys"])
+
+            orphans = []
+            for obj in chunk:
+                if obj.object_name in referenced:
+                    continue
+                if obj.last_modified is not None and obj.last_modified > cutoff:
+                    self.report["orphans_in_grace"] += 1
+                    continue
+                orphans.append(obj)
+            yield orphans
+
+    def _sample(self, kind: str, found: list):
+        self.report[kind] += len(found)
+        sample = self.report[f"{kind}_sample"]
+        for doc, missing in found[:REPORT_SAMPLE_SIZE - len(sample)]:
+            sample.append({"submission_id": str(doc["_id"]), "missing": missing})
+
+    def run(self) -> dict:
+        with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+            pending = []
+
+            # Dangling documents first, so objects left behind by deleting them are cleaned below
+            for chunk in self.find_dangling(executor):
+                dangling = [(doc, missing) for doc, missing, primary_missing in chunk if primary_missing]
+                incomplete = [(doc, missing) for doc, missing, primary_missing in chunk if not primary_missing]
+                self._sample("dangling", dangling)
+                self._sample("missing_renditions", incomplete)
+                if self.delete and dangling:
+                    result = self.submissions.delete_many({"_id": {"$in": [doc["_id"] for doc, _ in dangling]}})
+                    self.report["deleted_documents"] += result.deleted_count
+
+            if self.report["documents_without_keys"] and self.delete:
+                # Their objects would look unreferenced; run the 0002_backfill_object_keys migration first
+                logger.warning(f"{self.report['documents_without_keys']} submission(s) have no object_keys, "
+                               f"orphan deletion skipped")
+                delete_orphans = False
+            else:
+                delete_orphans = self.delete
+
+            for orphans in self.find_orphans():
+                self.report["orphans"] += len(orphans)
+                self.report["orphan_bytes"] += sum(obj.size or 0 for obj in orphans)
+                for obj in orphans[:REPORT_SAMPLE_SIZE - len(self.report["orphan_sample"])]:
+                    self.report["orphan_sample"].append(obj.object_name)
+                if delete_orphans:
+                    pending += self._delete_objects(executor, [obj.object_name for obj in orphans])
+                    if len(pending) >= self.parallel:
+                        # Bound the number of in-flight delete batches
+                        self._collect(pending)
+                        pending = []
+
+            self._collect(pending)
+        return self.report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m reconciler", description=__doc__.splitlines()[0])
+    parser.add_argument("--delete", action="store_true", help="delete orphans and dangling documents")
+    parser.add_argument("--bucket", default=MINIO_BUCKET_NAME)
+    parser.add_argument("--rate", type=float, default=RECONCILE_RATE, help="storage requests per second")
+    parser.add_argument("--parallel", type=int, default=RECONCILE_PARALLEL)
+    parser.add_argument("--grace-seconds", type=int, default=RECONCILE_GRACE_SECONDS)
+    parser.add_argument("--chunk-size", type=int, default=RECONCILE_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    reconciler = Reconciler(args.bucket, args.delete, args.rate, args.parallel, args.grace_seconds, args.chunk_size)
+    print(json.dumps(reconciler.run(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
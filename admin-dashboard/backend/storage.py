@@ -0,0 +1,68 @@
+import os
+from urllib.parse import urlparse
+
+from minio import Minio
+from minio.deleteobjects import DeleteObject
+
+from shared import metrics
+
+# Environment variables
+MINIO_URL = os.getenv("MINIO_URL", "minio:9000")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "muki")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "kenomuki")
+MINIO_BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "thumbnails")
+ENVIRONMENT = os.getenv("ENVIRONMENT", "")
+
+# S3 DeleteObjects accepts at most 1000 keys per request
+MINIO_DELETE_BATCH = min(int(os.getenv("MINIO_DELETE_BATCH", "1000")), 1000)
+
+# Minio client
+minio_client = Minio(
+    MINIO_URL,
+    access_key=MINIO_ACCESS_KEY,
+    secret_key=MINIO_SECRET_KEY,
+    secure=(ENVIRONMENT != "local"),
+)
+
+
+def object_keys(doc: dict) -> list:
+    """(bucket, key) of every object stored for a submission."""
+    keys = {(MINIO_BUCKET_NAME, key) for key in doc.get("object_keys") or []}
+    for rendition in (doc.get("renditions") or {}).values():
+        if rendition.get("key"):
+            keys.add((MINIO_BUCKET_NAME, rendition["key"]))
+
+    # Older submissions only recorded URLs of the form .../<bucket>/<key>
+    for field in ("image_url", "thumbnail_url"):
+        url = doc.get(field)
+        if url:
+            parts = urlparse(url).path.lstrip("/").split("/", 1)
+            if len(parts) == 2 and parts[1]:
+                keys.add((parts[0], parts[1]))
+    return sorted(keys)
+
+
+def remove_objects(keys: list) -> dict:
+    """Delete (bucket, key) pairs in batched DeleteObjects requests.
+
+    Returns {(bucket, key): error message} for the objects that could not
+    be removed; deleting a missing object is not an error.
+    """
+    failed = {}
+    by_bucket = {}
+    for bucket, key in keys:
+        by_bucket.setdefault(bucket, []).append(key)
+
+    for bucket, bucket_keys in by_bucket.items():
+        for start in range(0, len(bucket_keys), MINIO_DELETE_BATCH):
+            batch = bucket_keys[start:start + MINIO_DELETE_BATCH]
+            try:
+                # remove_objects is lazy; iterating it sends the request and yields only failures
+                with metrics.time_storage("remove_objects"):
+                    errors = list(minio_client.remove_objects(bucket, [DeleteObject(key) for key in batch]))
+                for error in errors:
+                    failed[(bucket, error.name)] = error.message or error.code
+            except Exception as e:
+                for key in batch:
+                    failed[(bucket, key)] = str(e)
+    return failed
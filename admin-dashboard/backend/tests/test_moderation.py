@@ -0,0 +1,64 @@
+import asyncio
+
+import mongomock
+import pytest
+
+import moderation
+
+
+class _Cursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def limit(self, count: int):
+        self._cursor = self._cursor.limit(count)
+        return self
+
+    async def to_list(self):
+        return list(self._cursor)
+
+
+class _AsyncCollection:
+    """Just the async collection calls moderation makes, over a mongomock collection."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args):
+        return _Cursor(self._collection.find(*args))
+
+    async def delete_many(self, *args):
+        return self._collection.delete_many(*args)
+
+    async def update_many(self, *args):
+        return self._collection.update_many(*args)
+
+
+@pytest.fixture
+def submissions(monkeypatch):
+    collection = mongomock.MongoClient().images.submissions
+    monkeypatch.setattr(moderation.mongo, "submissions_collection", _AsyncCollection(collection), raising=False)
+    monkeypatch.setattr(moderation, "remove_objects", lambda keys: {})
+    return collection
+
+
+def test_results_are_keyed_by_the_canonical_id(submissions):
+    obj_id = submissions.insert_one({"object_keys": []}).inserted_id
+    canonical = str(obj_id)
+
+    result = asyncio.run(moderation.moderate("hide", ids=[canonical.upper(), f" {canonical} ", canonical]))
+
+    assert result["matched"] == 1
+    assert result["results"] == {canonical: {"status": "hidden"}}
+    assert submissions.find_one({"_id": obj_id})["hidden"] is True
+
+
+def test_missing_and_invalid_ids(submissions):
+    missing = "65a000000000000000000000"
+    result = asyncio.run(moderation.moderate("delete", ids=[missing.upper(), "not-an-id"]))
+    assert result["results"] == {missing: {"status": "not_found"}, "not-an-id": {"status": "invalid_id"}}
+
+
+def test_canonical_id():
+    assert moderation.canonical_id(" 65A000000000000000000001\n") == "65a000000000000000000001"
+    assert moderation.canonical_id("65a0") is None
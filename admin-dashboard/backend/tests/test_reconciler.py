@@ -0,0 +1,135 @@
+"""Reconciler tests against a local MinIO, e.g. the one in docker-compose-local.yaml.
+
+Set MINIO_TEST_URL, MINIO_TEST_ACCESS_KEY and MINIO_TEST_SECRET_KEY to
+point elsewhere; the tests are skipped when no MinIO answers.
+"""
+import io
+import os
+import uuid
+
+import mongomock
+import pytest
+from minio import Minio
+
+import reconciler
+import storage
+
+MINIO_TEST_URL = os.getenv("MINIO_TEST_URL", "localhost:9000")
+MINIO_TEST_ACCESS_KEY = os.getenv("MINIO_TEST_ACCESS_KEY", "minioadmin")
+MINIO_TEST_SECRET_KEY = os.getenv("MINIO_TEST_SECRET_KEY", "minioadmin")
+
+
+@pytest.fixture(scope="module")
+def client():
+    client = Minio(MINIO_TEST_URL, access_key=MINIO_TEST_ACCESS_KEY, secret_key=MINIO_TEST_SECRET_KEY, secure=False)
+    try:
+        client.list_buckets()
+    except Exception as e:
+        pytest.skip(f"no MinIO at {MINIO_TEST_URL}: {e}")
+    return client
+
+
+@pytest.fixture
+def bucket(client, monkeypatch):
+    name = f"reconciler-test-{uuid.uuid4().hex[:12]}"
+    client.make_bucket(name)
+    monkeypatch.setattr(reconciler, "minio_client", client)
+    monkeypatch.setattr(storage, "minio_client", client)
+    yield name
+    for obj in client.list_objects(name, recursive=True):
+        client.remove_object(name, obj.object_name)
+    client.remove_bucket(name)
+
+
+@pytest.fixture
+def submissions(monkeypatch):
+    db = mongomock.MongoClient().images
+    monkeypatch.setattr(reconciler, "get_db", lambda: db)
+    return db.submissions
+
+
+def _put(client, bucket: str, key: str):
+    client.put_object(bucket, key, io.BytesIO(b"image"), 5)
+
+
+def _submission(bucket: str, prefix: str, renditions=("thumbnail", "full")) -> dict:
+    keys = {name: f"{prefix}-{name}.webp" for name in renditions}
+    return {
+        "image_url": f"http://minio/{bucket}/{keys['full']}",
+        "renditions": {name: {"key": key} for name, key in keys.items()},
+        "object_keys": sorted(keys.values()),
+    }
+
+
+def _run(bucket: str, delete: bool = False, grace_seconds: int = -3600) -> dict:
+    # A negative grace period counts objects written moments ago, whatever the clock skew
+    return reconciler.Reconciler(bucket, delete=delete, rate=0, parallel=2, grace_seconds=grace_seconds,
+                                 chunk_size=2).run()
+
+
+def test_dry_run_reports_without_deleting(client, bucket, submissions):
+    _put(client, bucket, "orphan.webp")
+    submissions.insert_one(_submission(bucket, "gone"))
+
+    report = _run(bucket)
+
+    assert report["orphans"] == 1 and report["orphan_sample"] == ["orphan.webp"]
+    assert report["dangling"] == 1
+    assert report["deleted_objects"] == 0 and report["deleted_documents"] == 0
+    assert submissions.count_documents({}) == 1
+    assert [obj.object_name for obj in client.list_objects(bucket)] == ["orphan.webp"]
+
+
+def test_delete_removes_orphans_and_keeps_referenced_objects(client, bucket, submissions):
+    doc = _submission(bucket, "kept")
+    submissions.insert_one(doc)
+    for key in doc["object_keys"]:
+        _put(client, bucket, key)
+    for i in range(3):
+        _put(client, bucket, f"orphan-{i}.webp")
+
+    report = _run(bucket, delete=True)
+
+    assert report["objects_scanned"] == 5
+    assert report["orphans"] == 3 and report["deleted_objects"] == 3
+    assert report["dangling"] == 0
+    assert sorted(obj.object_name for obj in client.list_objects(bucket)) == doc["object_keys"]
+
+
+def test_missing_full_image_is_dangling(client, bucket, submissions):
+    doc = _submission(bucket, "broken")
+    _put(client, bucket, "broken-thumbnail.webp")
+    submission_id = submissions.insert_one(doc).inserted_id
+
+    report = _run(bucket, delete=True)
+
+    assert report["dangling"] == 1
+    assert report["dangling_sample"] == [{"submission_id": str(submission_id), "missing": ["broken-full.webp"]}]
+    assert report["deleted_documents"] == 1
+    assert submissions.count_documents({}) == 0
+    # The thumbnail it left behind is now an orphan and removed in the same run
+    assert list(client.list_objects(bucket)) == []
+
+
+def test_missing_secondary_rendition_is_reported_not_deleted(client, bucket, submissions):
+    doc = _submission(bucket, "partial", renditions=("thumbnail", "full", "avif"))
+    _put(client, bucket, "partial-thumbnail.webp")
+    _put(client, bucket, "partial-full.webp")
+    submissions.insert_one(doc)
+
+    report = _run(bucket, delete=True)
+
+    assert report["dangling"] == 0
+    assert report["missing_renditions"] == 1
+    assert report["missing_renditions_sample"][0]["missing"] == ["partial-avif.webp"]
+    assert report["deleted_documents"] == 0
+    assert submissions.count_documents({}) == 1
+
+
+def test_new_objects_are_left_alone(client, bucket, submissions):
+    _put(client, bucket, "in-flight.webp")
+
+    report = _run(bucket, delete=True, grace_seconds=3600)
+
+    assert report["orphans"] == 0 and report["orphans_in_grace"] == 1
+    assert [obj.object_name for obj in client.list_objects(bucket)] == ["in-flight.webp"]
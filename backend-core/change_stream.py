@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+import mongo
+from shared.serializers import CORE_FEED_FIELDS
+
+logger = logging.getLogger("uvicorn")
+
+# Change streams need a replica set; on a standalone mongod the watcher disables itself
+CHANGE_STREAM_ENABLED = os.getenv("CHANGE_STREAM_ENABLED", "true").lower() == "true"
+CHANGE_STREAM_RETRY_SECONDS = float(os.getenv("CHANGE_STREAM_RETRY_SECONDS", "5"))
+
+# Server error codes meaning change streams are not available at all
+_UNSUPPORTED_CODES = {40573, 40324}
+
+_PIPELINE = [
+    {"$match": {"operationType": {"$in": ["insert", "delete", "update", "replace"]}}},
+    {"$project": {
+        "operationType": 1,
+        "documentKey": 1,
+        # Inserts carry what a feed row needs, for the live feed
+        **{f"fullDocument.{field}": 1 for field in CORE_FEED_FIELDS},
+        "fullDocument.hidden": 1,
+        "updateDescription.updatedFields": 1,
+        "updateDescription.removedFields": 1
+    }},
+]
+
+_listeners = []
+_task = None
+_available = True
+
+
+def add_listener(callback):
+    """Call callback(operation, obj_id, fields) for every submission change.
+
+    operation is "insert", "update" or "delete"; fields holds the changed
+    fields that are known (e.g. {"likes": 3}).
+    """
+    _listeners.append(callback)
+
+
+def available() -> bool:
+    """False once change streams are disabled or found to be unsupported."""
+    return _available and _task is not None
+
+
+def _dispatch(change: dict):
+    operation = change["operationType"]
+    obj_id = change["documentKey"]["_id"]
+    if operation in ("insert", "replace"):
+        operation = "insert"
+        fields = change.get("fullDocument") or {}
+    elif operation == "update":
+        description = change.get("updateDescription", {})
+        fields = dict(description.get("updatedFields", {}))
+        if "hidden" in description.get("removedFields", []):
+            fields["hidden"] = False
+    else:
+        fields = {}
+
+    for callback in _listeners:
+        try:
+            callback(operation, obj_id, fields)
+        except Exception as e:
+            logger.error(f"Change listener failed: {str(e)}")
+
+
+async def _run():
+    global _available
+    resume_token = None
+    while True:
+        try:
+            async with await mongo.submissions_collection.watch(_PIPELINE, resume_after=resume_token) as stream:
+                logger.info("Watching submissions change stream")
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    _dispatch(change)
+        except OperationFailure as e:
+            if e.code in _UNSUPPORTED_CODES:
+                logger.warning(f"Change streams unavailable, relying on cache TTLs: {str(e)}")
+                _available = False
+                return
+            logger.error(f"Change stream failed, retrying: {str(e)}")
+            resume_token = None if e.code == 286 else resume_token  # history lost, start fresh
+        except PyMongoError as e:
+            logger.error(f"Change stream interrupted, retrying: {str(e)}")
+        await asyncio.sleep(CHANGE_STREAM_RETRY_SECONDS)
+
+
+def start():
+    global _task
+    if CHANGE_STREAM_ENABLED:
+        _task = asyncio.create_task(_run())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -0,0 +1,103 @@
+import hashlib
+import math
+import os
+import time
+from collections import OrderedDict
+
+# Rendered feed pages are reused for this many seconds unless invalidated sooner
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", "30"))
+FEED_CACHE_MAX_ENTRIES = int(os.getenv("FEED_CACHE_MAX_ENTRIES", "512"))
+
+# (sort, start_after_id, start_after_likes) -> entry dict, least recently used first
+_entries = OrderedDict()
+
+
+def make_key(sort: str, start_after_id, start_after_likes) -> tuple:
+    # The likes cursor is ignored by the date feed, so it must not split the cache
+    if sort != "likes":
+        start_after_likes = None
+    return sort, start_after_id, start_after_likes
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def get(key: tuple):
+    """Return the cached entry for key, or None if missing or expired."""
+    entry = _entries.get(key)
+    if entry is None:
+        return None
+    if entry["expires"] < time.monotonic():
+        del _entries[key]
+        return None
+    _entries.move_to_end(key)
+    return entry
+
+
+def put(key: tuple, body: bytes, images: list, limit: int) -> dict:
+    """Store a serialized page together with what it depends on."""
+    sort, _, start_after_likes = key
+
+    # Range of like counts this page covers, from its cursor down to its last row.
+    # A post whose count moves into that range changes the page.
+    likes_high = start_after_likes if start_after_likes is not None else math.inf
+    likes_low = images[-1]["likes"] if len(images) == limit else -math.inf
+
+    entry = {
+        "body": body,
+        "etag": make_etag(body),
+        "expires": time.monotonic() + FEED_CACHE_TTL,
+        "ids": {image["submission_id"] for image in images},
+        "likes_range": (likes_low, likes_high),
+    }
+    _entries[key] = entry
+    _entries.move_to_end(key)
+    while len(_entries) > FEED_CACHE_MAX_ENTRIES:
+        _entries.popitem(last=False)
+    return entry
+
+
+def _drop(predicate):
+    for key in [key for key, entry in _entries.items() if predicate(key, entry)]:
+        del _entries[key]
+
+
+def invalidate_likes(submission_id: str, old_likes: int, new_likes: int):
+    """A like count changed: drop pages showing the post or whose likes range it crosses."""
+    low, high = min(old_likes, new_likes), max(old_likes, new_likes)
+
+    def affected(key, entry):
+        if submission_id in entry["ids"]:
+            return True
+        if key[0] != "likes":
+            return False
+        range_low, range_high = entry["likes_range"]
+        return range_low <= high and low <= range_high
+
+    _drop(affected)
+
+
+def invalidate_new_submission():
+    """A post was added: it is newest by date and has zero likes."""
+    def affected(key, entry):
+        if key[0] == "date":
+            return key[1] is None
+        return entry["likes_range"][0] <= 0
+
+    _drop(affected)
+
+
+def invalidate_deleted(submission_id: str):
+    _drop(lambda key, entry: submission_id in entry["ids"])
+
+
+def clear():
+    _entries.clear()
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_right, insort
+
+from bson import ObjectId
+
+import change_stream
+import mongo
+from shared.serializers import VISIBLE
+
+logger = logging.getLogger("uvicorn")
+
+# Full reload from Mongo as a safety net for changes this process did not see
+LEADERBOARD_RELOAD_SECONDS = float(os.getenv("LEADERBOARD_RELOAD_SECONDS", "300"))
+
+# Sorted ascending on (-likes, -_id), i.e. the order of the "likes" feed
+_keys = []
+_likes = {}  # submission ObjectId -> likes
+_hidden = set()  # submissions hidden by moderators, never ranked
+_ready = False
+_task = None
+_replay = None  # changes seen while load() scans, applied again to the index it builds
+
+
+def _sort_key(obj_id, likes: int) -> tuple:
+    return -likes, -int.from_bytes(obj_id.binary, "big")
+
+
+def _id_from_key(key: tuple) -> ObjectId:
+    return ObjectId((-key[1]).to_bytes(12, "big"))
+
+
+def ready() -> bool:
+    # Without change streams, posts and likes from other processes only arrive with the next
+    # reload, so the likes feed is served from Mongo instead
+    return _ready and change_stream.available()
+
+
+def likes_of(obj_id):
+    return _likes.get(obj_id)
+
+
+def update(obj_id, likes: int):
+    """Insert a submission or move it to its new like count."""
+    _remember(update, obj_id, likes)
+    if obj_id in _hidden:
+        return
+    old = _likes.get(obj_id)
+    if old == likes:
+        return
+    if old is not None:
+        _remove_key(_sort_key(obj_id, old))
+    _likes[obj_id] = likes
+    insort(_keys, _sort_key(obj_id, likes))
+
+
+def remove(obj_id):
+    _remember(remove, obj_id)
+    _forget(obj_id)
+
+
+def hide(obj_id):
+    _remember(hide, obj_id)
+    _hidden.add(obj_id)
+    _forget(obj_id)
+
+
+def _show(obj_id):
+    _remember(_show, obj_id)
+    _hidden.discard(obj_id)
+
+
+async def unhide(obj_id):
+    """Rank a submission again, with its like count re-read from Mongo."""
+    _show(obj_id)
+    doc = await mongo.submissions_collection.find_one({"_id": obj_id, **VISIBLE}, {"likes": 1})
+    if doc is not None:
+        update(obj_id, doc.get("likes", 0))
+
+
+def _remember(change, *args):
+    if _replay is not None:
+        _replay.append((change, args))
+
+
+def _forget(obj_id):
+    old = _likes.pop(obj_id, None)
+    if old is not None:
+        _remove_key(_sort_key(obj_id, old))
+
+
+def _remove_key(key: tuple):
+    index = bisect_right(_keys, key) - 1
+    if index >= 0 and _keys[index] == key:
+        del _keys[index]
+
+
+def page(start_after_id=None, start_after_likes=None, limit: int = 5) -> list:
+    """(ObjectId, likes) pairs of the page after the cursor, in feed order."""
+    start = 0
+    if start_after_id is not None and start_after_likes is not None:
+        start = bisect_right(_keys, _sort_key(start_after_id, start_after_likes))
+    return [(_id_from_key(key), -key[0]) for key in _keys[start:start + limit]]
+
+
+async def load():
+    """Rebuild the index from a projected scan of the collection.
+
+    Changes that arrive during the scan may or may not be in what it read,
+    so they are applied again, in order, once the new index is in place.
+    """
+    global _keys, _likes, _hidden, _ready, _replay
+    started = time.monotonic()
+    likes = {}
+    hidden = set()
+    _replay = []
+    try:
+        async for doc in mongo.submissions_collection.find({}, {"likes": 1, "hidden": 1}):
+            if doc.get("hidden"):
+                hidden.add(doc["_id"])
+            else:
+                likes[doc["_id"]] = doc.get("likes", 0)
+    except BaseException:
+        _replay = None
+        raise
+
+    changes, _replay = _replay, None
+    _likes = likes
+    _hidden = hidden
+    _keys = sorted(_sort_key(obj_id, count) for obj_id, count in likes.items())
+    for change, args in changes:
+        change(*args)
+    _ready = True
+    logger.info(f"Leaderboard loaded {len(_keys)} submission(s) in {time.monotonic() - started:.3f}s")
+
+
+async def _run():
+    while True:
+        try:
+            await load()
+        except Exception as e:
+            # The likes feed falls back to Mongo queries until a reload succeeds
+            logger.error(f"Leaderboard load failed: {str(e)}")
+        await asyncio.sleep(LEADERBOARD_RELOAD_SECONDS)
+
+
+def start():
+    """Load in the background so start-up does not wait on MongoDB."""
+    global _task
+    _task = asyncio.create_task(_run())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
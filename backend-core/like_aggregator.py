@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+import mongo
+from shared.serializers import VISIBLE
+
+logger = logging.getLogger("uvicorn")
+
+# Pending like changes are written at most this often, or sooner after LIKE_FLUSH_EVENTS events
+LIKE_FLUSH_MS = int(os.getenv("LIKE_FLUSH_MS", "250"))
+LIKE_FLUSH_EVENTS = int(os.getenv("LIKE_FLUSH_EVENTS", "500"))
+# A cached count without pending changes is re-read from Mongo after this many seconds
+LIKE_VIEW_TTL = float(os.getenv("LIKE_VIEW_TTL", "30"))
+LIKE_VIEW_MAX_ENTRIES = int(os.getenv("LIKE_VIEW_MAX_ENTRIES", "10000"))
+
+# submission ObjectId -> [flushed count, current count, loaded at]
+# "current - flushed" is the delta still waiting to be written
+_counts = OrderedDict()
+_listeners = []
+_events = 0
+_wakeup = None
+_flush_lock = None
+_task = None
+
+
+class SubmissionNotFound(Exception):
+    pass
+
+
+def add_listener(callback):
+    """Call callback(obj_id, old_likes, new_likes) for every count written by a flush."""
+    _listeners.append(callback)
+
+
+def _evict():
+    # Drop least recently used counts, never ones with unflushed changes
+    if len(_counts) <= LIKE_VIEW_MAX_ENTRIES:
+        return
+    for obj_id in list(_counts):
+        if len(_counts) <= LIKE_VIEW_MAX_ENTRIES:
+            break
+        entry = _counts[obj_id]
+        if entry[0] == entry[1]:
+            del _counts[obj_id]
+
+
+async def _load(obj_id) -> list:
+    entry = _counts.get(obj_id)
+    if entry is not None and (entry[0] != entry[1] or time.monotonic() - entry[2] < LIKE_VIEW_TTL):
+        return entry
+
+    doc = await mongo.submissions_collection.find_one({"_id": obj_id, **VISIBLE}, {"likes": 1})
+    if not doc:
+        raise SubmissionNotFound(str(obj_id))
+    stored = doc.get("likes", 0)
+
+    # Another request may have touched the entry while we were waiting on Mongo
+    entry = _counts.get(obj_id)
+    if entry is None:
+        entry = _counts[obj_id] = [stored, stored, time.monotonic()]
+    elif entry[0] == entry[1]:
+        entry[0] = entry[1] = stored
+        entry[2] = time.monotonic()
+    return entry
+
+
+async def apply(obj_id, step: int) -> int:
+    """Record a like (+1) or unlike (-1) and return the resulting count."""
+    global _events
+    entry = await _load(obj_id)
+
+    # Same floor as the server-side update, applied per event
+    entry[1] = max(0, entry[1] + step)
+    _counts.move_to_end(obj_id)
+
+    _events += 1
+    if _events >= LIKE_FLUSH_EVENTS:
+        _wakeup.set()
+    _evict()
+    return entry[1]
+
+
+def current(obj_id):
+    """Count as seen by this process, or None if it is not cached."""
+    entry = _counts.get(obj_id)
+    return entry[1] if entry is not None else None
+
+
+async def flush() -> int:
+    """Write all pending deltas as one unordered bulk_write of $inc-style updates.
+
+    The stored counts are then read back in one query, so listeners and this
+    process see the server's value, including other workers' likes.
+    """
+    global _events
+    async with _flush_lock:
+        deltas = [(obj_id, entry[1] - entry[0]) for obj_id, entry in _counts.items() if entry[1] != entry[0]]
+        if not deltas:
+            return 0
+        _events = 0
+
+        # Pipeline update so the zero floor is enforced by the server
+        operations = [
+            UpdateOne({"_id": obj_id}, [{"$set": {"likes": {"$max": [0, {"$add": [{"$ifNull": ["$likes", 0]}, delta]}]}}}])
+            for obj_id, delta in deltas
+        ]
+
+        failed = set()
+        try:
+            await mongo.submissions_collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            logger.error(f"Like flush: {len(failed)} of {len(operations)} update(s) failed")
+        except Exception as e:
+            logger.error(f"Like flush failed, will retry: {str(e)}")
+            return 0
+
+        # Read back what the server holds, which includes other workers' flushes
+        written = [(obj_id, delta) for index, (obj_id, delta) in enumerate(deltas) if index not in failed]
+        ids = [obj_id for obj_id, _ in written]
+        try:
+            cursor = mongo.submissions_collection.find({"_id": {"$in": ids}}, {"likes": 1})
+            stored = {doc["_id"]: doc.get("likes", 0) async for doc in cursor}
+        except Exception as e:
+            logger.error(f"Like flush read-back failed, counts will be reloaded: {str(e)}")
+            stored = None
+
+        # Counts changed while the write was in flight stay pending for the next flush
+        for obj_id, delta in written:
+            entry = _counts.get(obj_id)
+            if entry is None:
+                continue
+            if stored is None:
+                entry[0] += delta
+                entry[2] = 0.0  # stale; re-read once nothing is pending
+                continue
+            if obj_id not in stored:
+                del _counts[obj_id]  # deleted meanwhile
+                continue
+            old_likes = entry[0]
+            pending = entry[1] - (entry[0] + delta)
+            entry[0] = stored[obj_id]
+            entry[1] = max(0, entry[0] + pending)
+            entry[2] = time.monotonic()
+            for callback in _listeners:
+                try:
+                    callback(obj_id, old_likes, entry[0])
+                except Exception as e:
+                    logger.error(f"Like listener failed: {str(e)}")
+        return len(written)
+
+
+async def _run():
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=LIKE_FLUSH_MS / 1000)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        try:
+            await flush()
+        except Exception as e:
+            logger.error(f"Like aggregator error: {str(e)}")
+
+
+def start():
+    global _wakeup, _flush_lock, _task
+    _wakeup = asyncio.Event()
+    _flush_lock = asyncio.Lock()
+    _task = asyncio.create_task(_run())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    # Don't lose likes received since the last tick
+    await flush()
@@ -0,0 +1,209 @@
+"""Server-sent events for new submissions and like counts.
+
+One hub per worker fans every event out to all connected clients. Events
+come from the submissions change stream and this worker's like flushes;
+without a replica set, new submissions are found by polling instead. Each
+event is serialized once and shared by every client.
+
+A client that falls behind is not buffered without limit: its pending like
+counts are coalesced to the latest one per post, and once more than
+LIVE_FEED_QUEUE_SIZE other events are waiting they are dropped in favour of
+a single "resync" event, after which the client should reload its feed.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+import change_stream
+import mongo
+from shared import metrics
+from shared.serializers import CORE_FEED_FIELDS, VISIBLE, dumps, projection, serialize_submission
+
+logger = logging.getLogger("uvicorn")
+
+# Limits are per uvicorn worker
+LIVE_FEED_MAX_CLIENTS = int(os.getenv("LIVE_FEED_MAX_CLIENTS", "1000"))
+LIVE_FEED_QUEUE_SIZE = int(os.getenv("LIVE_FEED_QUEUE_SIZE", "100"))
+LIVE_FEED_MAX_PENDING_LIKES = int(os.getenv("LIVE_FEED_MAX_PENDING_LIKES", "1000"))
+LIVE_FEED_HEARTBEAT_SECONDS = float(os.getenv("LIVE_FEED_HEARTBEAT_SECONDS", "15"))
+# Streams are ended after this long and the browser reconnects, so shutdowns and
+# rolling deploys never wait on open connections for long
+LIVE_FEED_MAX_SECONDS = float(os.getenv("LIVE_FEED_MAX_SECONDS", "300"))
+LIVE_FEED_RETRY_MS = int(os.getenv("LIVE_FEED_RETRY_MS", "3000"))
+# Used only while the change stream is unavailable
+LIVE_FEED_POLL_SECONDS = float(os.getenv("LIVE_FEED_POLL_SECONDS", "5"))
+
+_HEARTBEAT = b": ping\n\n"
+_RESYNC = b"event: resync\ndata: {}\n\n"
+
+_subscribers = set()
+_closing = False
+_task = None
+
+
+def _frame(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+class Subscriber:
+    __slots__ = ("events", "likes", "overflowed", "wakeup")
+
+    def __init__(self):
+        self.events = deque()
+        self.likes = {}  # submission id -> latest count, in order of first change
+        self.overflowed = False
+        self.wakeup = asyncio.Event()
+
+    def push(self, frame: bytes):
+        if self.overflowed:
+            return
+        if len(self.events) >= LIVE_FEED_QUEUE_SIZE:
+            self._overflow()
+        else:
+            self.events.append(frame)
+        self.wakeup.set()
+
+    def push_likes(self, submission_id: str, likes: int):
+        if self.overflowed:
+            return
+        if submission_id not in self.likes and len(self.likes) >= LIVE_FEED_MAX_PENDING_LIKES:
+            self._overflow()
+        else:
+            self.likes[submission_id] = likes
+        self.wakeup.set()
+
+    def _overflow(self):
+        # Too slow to keep up; a reload is cheaper than replaying everything it missed
+        self.events.clear()
+        self.likes.clear()
+        self.overflowed = True
+        metrics.LIVE_FEED_RESYNCS.inc()
+
+    def drain(self) -> bytes:
+        if self.overflowed:
+            self.overflowed = False
+            return _RESYNC
+        chunk = b"".join(self.events)
+        self.events.clear()
+        if self.likes:
+            chunk += _frame("likes", self.likes)
+            self.likes = {}
+        return chunk
+
+
+def full() -> bool:
+    return len(_subscribers) >= LIVE_FEED_MAX_CLIENTS
+
+
+def publish_submission(doc: dict):
+    frame = _frame("submission", serialize_submission(doc, CORE_FEED_FIELDS))
+    for subscriber in _subscribers:
+        subscriber.push(frame)
+
+
+def publish_removed(obj_id):
+    frame = _frame("removed", {"submission_id": str(obj_id)})
+    for subscriber in _subscribers:
+        subscriber.push(frame)
+
+
+def publish_likes(obj_id, likes: int):
+    submission_id = str(obj_id)
+    for subscriber in _subscribers:
+        subscriber.push_likes(submission_id, likes)
+
+
+def on_likes_flushed(obj_id, old_likes: int, new_likes: int):
+    publish_likes(obj_id, new_likes)
+
+
+def on_submission_changed(operation: str, obj_id, fields: dict):
+    if operation == "insert":
+        if not fields.get("hidden"):
+            publish_submission({"_id": obj_id, **fields})
+    elif operation == "delete" or fields.get("hidden") is True:
+        publish_removed(obj_id)
+    elif "likes" in fields:
+        publish_likes(obj_id, fields["likes"])
+
+
+async def stream():
+    """Event stream for one client; ends on shutdown or after LIVE_FEED_MAX_SECONDS."""
+    subscriber = Subscriber()
+    _subscribers.add(subscriber)
+    metrics.LIVE_FEED_CLIENTS.inc()
+    deadline = time.monotonic() + LIVE_FEED_MAX_SECONDS
+    try:
+        yield f"retry: {LIVE_FEED_RETRY_MS}\n\n".encode()
+        while not _closing:
+            timeout = min(LIVE_FEED_HEARTBEAT_SECONDS, deadline - time.monotonic())
+            if timeout <= 0:
+                break
+            try:
+                await asyncio.wait_for(subscriber.wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                yield _HEARTBEAT
+                continue
+            subscriber.wakeup.clear()
+            chunk = subscriber.drain()
+            if chunk:
+                # Waits while the client's socket is backed up; events coalesce meanwhile
+                yield chunk
+    finally:
+        _subscribers.discard(subscriber)
+        metrics.LIVE_FEED_CLIENTS.dec()
+
+
+async def _newest_id():
+    doc = await mongo.submissions_collection.find_one({}, {"_id": 1}, sort=[("_id", DESCENDING)])
+    return doc["_id"] if doc else ObjectId("0" * 24)
+
+
+async def _poll():
+    # Visible submissions past the newest one seen, one query per worker
+    last_id = None
+    while True:
+        await asyncio.sleep(LIVE_FEED_POLL_SECONDS)
+        if change_stream.available() or not _subscribers:
+            last_id = None
+            continue
+        try:
+            if last_id is None:
+                last_id = await _newest_id()
+                continue
+            cursor = (
+                mongo.submissions_collection.find({"_id": {"$gt": last_id}, **VISIBLE}, projection(CORE_FEED_FIELDS))
+                .sort("_id", ASCENDING)
+                .limit(LIVE_FEED_QUEUE_SIZE)
+            )
+            async for doc in cursor:
+                publish_submission(doc)
+                last_id = doc["_id"]
+        except Exception as e:
+            logger.error(f"Live feed poll failed: {str(e)}")
+
+
+def start():
+    global _closing, _task
+    _closing = False
+    _task = asyncio.create_task(_poll())
+
+
+async def stop():
+    """End every open stream and the poller."""
+    global _closing, _task
+    _closing = True
+    for subscriber in _subscribers:
+        subscriber.wakeup.set()
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -1,21 +1,106 @@
+import asyncio
 import logging
 import os
+from contextlib import asynccontextmanager
 
 from bson import ObjectId
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pymongo import DESCENDING
 
-from mongo import submissions_collection
+import change_stream
+import feed_cache
+import leaderboard
+import like_aggregator
+import live_feed
+import mongo
+from shared import metrics, profiling
+from shared.indexes import ensure_indexes_async
+from shared.serializers import CORE_FEED_FIELDS, VISIBLE, dumps, projection, serialize_submission
+
+logger = logging.getLogger("uvicorn")
+
+_background_tasks = set()
+
+
+async def _bootstrap_indexes():
+    try:
+        await ensure_indexes_async(mongo.db)
+    except Exception as e:
+        logger.error(f"Index bootstrap failed: {str(e)}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing here waits on MongoDB; the client connects on first use
+    index_task = asyncio.create_task(_bootstrap_indexes())
+    like_aggregator.add_listener(_on_likes_flushed)
+    change_stream.add_listener(_on_submission_changed)
+    like_aggregator.add_listener(live_feed.on_likes_flushed)
+    change_stream.add_listener(live_feed.on_submission_changed)
+    leaderboard.start()
+    like_aggregator.start()
+    change_stream.start()
+    live_feed.start()
+    yield
+    await live_feed.stop()
+    await change_stream.stop()
+    await like_aggregator.stop()
+    await leaderboard.stop()
+    index_task.cancel()
+    await mongo.close()
+
+
+def _run_in_background(coro):
+    # The loop only keeps weak references to tasks; hold one until it finishes
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_done)
+
+
+def _background_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task failed: {str(task.exception())}")
+
+
+def _on_likes_flushed(obj_id, old_likes: int, new_likes: int):
+    leaderboard.update(obj_id, new_likes)
+    feed_cache.invalidate_likes(str(obj_id), old_likes, new_likes)
+
+
+def _on_submission_changed(operation: str, obj_id, fields: dict):
+    # Also sees writes made by other processes: new posts, admin deletes, other workers' likes
+    if operation == "insert":
+        leaderboard.update(obj_id, fields.get("likes", 0))
+        feed_cache.invalidate_new_submission()
+    elif operation == "delete":
+        leaderboard.remove(obj_id)
+        feed_cache.invalidate_deleted(str(obj_id))
+    elif fields.get("hidden") is True:
+        # Hidden by a moderator: drop it like a delete, and keep later like flushes from re-ranking it
+        leaderboard.hide(obj_id)
+        feed_cache.invalidate_deleted(str(obj_id))
+    elif fields.get("hidden") is False:
+        # Unhidden: its like count is unknown here, and it may belong on any page
+        _run_in_background(leaderboard.unhide(obj_id))
+        feed_cache.clear()
+    elif "likes" in fields:
+        old_likes = leaderboard.likes_of(obj_id)
+        leaderboard.update(obj_id, fields["likes"])
+        feed_cache.invalidate_likes(
+            str(obj_id), old_likes if old_likes is not None else fields["likes"], fields["likes"]
+        )
+
 
 app = FastAPI(
     docs_url=None,
     redoc_url=None,
-    openapi_url=None
+    openapi_url=None,
+    lifespan=lifespan
 )
 
-logger = logging.getLogger("uvicorn")
 api_router = APIRouter()
 
 ENVIRONMENT = os.getenv("ENVIRONMENT", "")
@@ -32,6 +117,8 @@ app.add_middleware(
     allow_methods=["POST", "GET"],
     allow_headers=["*"],
 )
+metrics.instrument(app)
+profiling.instrument(app, prefix="/api/core")
 
 
 # Health check
@@ -40,12 +127,29 @@ async def health():
     return {"status": "ok"}
 
 
+@api_router.get("/ready", response_class=JSONResponse)
+async def ready():
+    # Readiness probe: only report ready while MongoDB answers a ping
+    if not await mongo.ping():
+        return JSONResponse(status_code=503, content={"status": "unavailable", "mongo": False})
+    return {"status": "ok", "mongo": True}
+
+
+def _feed_response(entry: dict, if_none_match: str) -> Response:
+    # Clients must revalidate, which costs only a 304 while the page is unchanged
+    headers = {"ETag": entry["etag"], "Cache-Control": "no-cache"}
+    if feed_cache.etag_matches(if_none_match, entry["etag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
+
+
 # Assuming submissions_collection is your MongoDB collection
 @api_router.get("/images")
 async def get_images(
         sort: str = "date",
         start_after_id: str = None,
-        start_after_likes: int = None
+        start_after_likes: int = None,
+        if_none_match: str = Header(None)
 ):
     limit = 5
     try:
@@ -53,55 +157,85 @@ async def get_images(
         if sort not in ["date", "likes"]:
             raise HTTPException(status_code=400, detail="Invalid sort parameter. Must be 'date' or 'likes'.")
 
+        # Serve hot pages from the in-process cache
+        cache_key = feed_cache.make_key(sort, start_after_id, start_after_likes)
+        entry = feed_cache.get(cache_key)
+        if entry is not None:
+            return _feed_response(entry, if_none_match)
+
         # Define query and sort criteria
-        query_filter = {}
+        query_filter = dict(VISIBLE)
         if sort == "date":
             sort_fields = [("_id", DESCENDING)]  # Newest first
             if start_after_id:
-                query_filter = {"_id": {"$lt": ObjectId(start_after_id)}}
+                query_filter["_id"] = {"$lt": ObjectId(start_after_id)}
         elif sort == "likes":
             sort_fields = [("likes", DESCENDING), ("_id", DESCENDING)]  # Likes, then _id as tiebreaker
             if start_after_id and start_after_likes is not None:
-                query_filter = {
-                    "$or": [
-                        {"likes": {"$lt": start_after_likes}},
-                        {"likes": start_after_likes, "_id": {"$lt": ObjectId(start_after_id)}}
-                    ]
-                }
-
-        # Log for debugging
-        # Fetch from MongoDB
-        cursor = submissions_collection.find(query_filter).sort(sort_fields).limit(limit)
+                query_filter["$or"] = [
+                    {"likes": {"$lt": start_after_likes}},
+                    {"likes": start_after_likes, "_id": {"$lt": ObjectId(start_after_id)}}
+                ]
+
         images_data = []
         last_id = None
         last_likes = None
 
-        for doc in cursor:
-            image_data = {
-                "submission_id": str(doc["_id"]),
-                "thumbnail_url": doc.get("thumbnail_url", ""),
-                "timestamp": doc.get("timestamp").isoformat() if doc.get("timestamp") else "",
-                "likes": doc.get("likes", 0),
-                "username": doc.get("username", "unknown")
-            }
-            images_data.append(image_data)
-            last_id = str(doc["_id"])
-            last_likes = doc.get("likes", 0) if sort == "likes" else None
+        if sort == "likes" and leaderboard.ready():
+            # Cut the page from the in-memory index and fetch exactly those documents
+            cursor_id = ObjectId(start_after_id) if start_after_id and start_after_likes is not None else None
+            ranked = leaderboard.page(cursor_id, start_after_likes, limit)
+            ids = [obj_id for obj_id, _ in ranked]
+            docs = {}
+            async for doc in mongo.submissions_collection.find({"_id": {"$in": ids}, **VISIBLE}, projection(CORE_FEED_FIELDS)):
+                docs[doc["_id"]] = doc
+            for obj_id, likes in ranked:
+                if obj_id in docs:
+                    images_data.append(serialize_submission(docs[obj_id], CORE_FEED_FIELDS))
+            page_size = len(ranked)
+            if ranked:
+                last_id, last_likes = str(ranked[-1][0]), ranked[-1][1]
+        else:
+            # Fetch from MongoDB
+            cursor = (
+                mongo.submissions_collection.find(query_filter, projection(CORE_FEED_FIELDS))
+                .sort(sort_fields)
+                .limit(limit)
+            )
+            async for doc in cursor:
+                images_data.append(serialize_submission(doc, CORE_FEED_FIELDS))
+                last_id = str(doc["_id"])
+                last_likes = doc.get("likes", 0) if sort == "likes" else None
+            page_size = len(images_data)
 
         # Prepare response
         response = {"images": images_data}
-        if len(images_data) == limit:  # More data exists
+        if page_size == limit:  # More data exists
             response["next_start_after_id"] = last_id
             if sort == "likes":
                 response["next_start_after_likes"] = last_likes
 
-        return JSONResponse(content=response)
+        body = dumps(response)
+        entry = feed_cache.put(cache_key, body, images_data, limit)
+        return _feed_response(entry, if_none_match)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching images: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch images: {str(e)}")
 
 
+# Live feed: new submissions and like counts as server-sent events
+@api_router.get("/stream")
+async def stream():
+    if live_feed.full():
+        raise HTTPException(status_code=503, detail="Too many live feed connections", headers={"Retry-After": "30"})
+    # X-Accel-Buffering stops nginx from holding events back
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(live_feed.stream(), media_type="text/event-stream", headers=headers)
+
+
 # Endpoint to like or unlike a post
 @api_router.post("/like")
 async def like_post(submission_id: str, like_action: str):
@@ -116,33 +250,18 @@ async def like_post(submission_id: str, like_action: str):
         except Exception as e:
             raise HTTPException(status_code=400, detail="Invalid submission_id format.")
 
-        # Query the database to find the submission
-        submission = submissions_collection.find_one({"_id": obj_id})
-
-        if not submission:
+        # Counted in-process; the aggregator writes batched updates to Mongo
+        step = 1 if like_action == "increase" else -1
+        try:
+            new_likes = await like_aggregator.apply(obj_id, step)
+        except like_aggregator.SubmissionNotFound:
             raise HTTPException(status_code=404, detail="Submission not found.")
 
-        # Get current like count or default to 0 if not present
-        current_likes = submission.get('likes', 0)
-
-        # Modify the likes count
-        if like_action == "increase":
-            new_likes = current_likes + 1
-        elif like_action == "decrease" and current_likes > 0:
-            new_likes = current_likes - 1
-        else:
-            # Prevent likes from going below zero
-            new_likes = current_likes
-
-        # Update the likes count in the database
-        submissions_collection.update_one(
-            {"_id": obj_id},
-            {"$set": {"likes": new_likes}}
-        )
-
         # Return the updated like count
         return JSONResponse(content={"status": "success", "likes": new_likes})
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating likes: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to update likes: {str(e)}")
@@ -0,0 +1,155 @@
+import math
+import os
+import time
+from collections import OrderedDict
+
+from shared import metrics
+from utils import render_pool
+
+# Token buckets, per client IP (X-Real-IP from nginx) and shared by everyone; limits apply
+# per uvicorn worker. A rate of 0 disables its bucket.
+RATE_LIMIT_CLIENT_PER_MINUTE = float(os.getenv("RATE_LIMIT_CLIENT_PER_MINUTE", "10"))
+RATE_LIMIT_CLIENT_BURST = float(os.getenv("RATE_LIMIT_CLIENT_BURST", "5"))
+RATE_LIMIT_GLOBAL_PER_SECOND = float(os.getenv("RATE_LIMIT_GLOBAL_PER_SECOND", str(5 * render_pool.RENDER_WORKERS)))
+RATE_LIMIT_GLOBAL_BURST = float(os.getenv("RATE_LIMIT_GLOBAL_BURST", str(2 * RATE_LIMIT_GLOBAL_PER_SECOND)))
+# Least recently seen clients are forgotten beyond this many; they start again with a full bucket
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+
+# Load shedding: renders waiting or running, and the share of the available cores used
+# over the last ADMISSION_CPU_WINDOW seconds
+ADMISSION_MAX_BACKLOG = int(os.getenv("ADMISSION_MAX_BACKLOG", str(render_pool.RENDER_QUEUE_SIZE)))
+ADMISSION_MAX_CPU = float(os.getenv("ADMISSION_MAX_CPU", "0.95"))
+ADMISSION_CPU_WINDOW = float(os.getenv("ADMISSION_CPU_WINDOW", "5"))
+
+
+class Refused(Exception):
+    """A submission turned away before any work; maps to an HTTP error with Retry-After."""
+
+    def __init__(self, status_code: int, reason: str, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available; 0 if one is available now."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+_clients = OrderedDict()  # client IP -> TokenBucket
+_global = None
+
+# cgroup v2 accounting covers the whole container: every uvicorn worker and render process
+CGROUP_CPU_STAT = "/sys/fs/cgroup/cpu.stat"
+CGROUP_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+
+
+def _cpu_time() -> float:
+    """CPU seconds used so far by the container, or else by this process and its render workers."""
+    try:
+        with open(CGROUP_CPU_STAT) as f:
+            for line in f:
+                if line.startswith("usage_usec "):
+                    return int(line.split()[1]) / 1e6
+    except OSError:
+        pass
+    return time.process_time() + render_pool.cpu_seconds()
+
+
+def _cpu_capacity() -> float:
+    """Cores available: the container's CPU quota if one is set, else every core."""
+    try:
+        with open(CGROUP_CPU_MAX) as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    return os.cpu_count() or 1
+
+
+_window_started = time.monotonic()
+_window_cpu = _cpu_time()
+_cpu_load = 0.0  # share of the available cores used during the last full window
+
+
+def _client_bucket(client: str, now: float) -> TokenBucket:
+    bucket = _clients.get(client)
+    if bucket is None:
+        bucket = _clients[client] = TokenBucket(RATE_LIMIT_CLIENT_PER_MINUTE / 60, RATE_LIMIT_CLIENT_BURST, now)
+        while len(_clients) > RATE_LIMIT_MAX_CLIENTS:
+            _clients.popitem(last=False)
+    else:
+        _clients.move_to_end(client)
+    return bucket
+
+
+def _update_cpu_load(now: float) -> float:
+    """Close the CPU window once it has run its length; returns the seconds left in it."""
+    global _window_started, _window_cpu, _cpu_load
+    elapsed = now - _window_started
+    if elapsed >= ADMISSION_CPU_WINDOW:
+        cpu = _cpu_time()
+        _cpu_load = (cpu - _window_cpu) / (elapsed * _cpu_capacity())
+        _window_started, _window_cpu = now, cpu
+        elapsed = 0.0
+    return ADMISSION_CPU_WINDOW - elapsed
+
+
+def cpu_load() -> float:
+    return _cpu_load
+
+
+def _refuse(status_code: int, reason: str, detail: str, retry_after: float):
+    metrics.SUBMISSIONS_REFUSED.labels(reason).inc()
+    raise Refused(status_code, reason, detail, retry_after)
+
+
+def admit(client: str, renders: bool = True):
+    """Take a submission slot for client, or raise Refused.
+
+    Overload is checked first, so shed requests do not use up rate limit
+    tokens. renders is False for submissions only queued as jobs, which
+    the render backlog does not apply to.
+    """
+    global _global
+    now = time.monotonic()
+
+    if renders and render_pool.queue_depth() >= ADMISSION_MAX_BACKLOG:
+        _refuse(503, "backlog", "Image generation is busy, please try again shortly", render_pool.RENDER_RETRY_AFTER)
+    window_left = _update_cpu_load(now)
+    if _cpu_load > ADMISSION_MAX_CPU:
+        _refuse(503, "cpu", "Image generation is busy, please try again shortly", window_left)
+
+    # Both buckets must have a token before either is spent
+    client_bucket = None
+    if RATE_LIMIT_CLIENT_PER_MINUTE > 0:
+        client_bucket = _client_bucket(client, now)
+        wait = client_bucket.wait_time(now)
+        if wait > 0:
+            _refuse(429, "client_rate", "Too many submissions, please slow down", wait)
+    if RATE_LIMIT_GLOBAL_PER_SECOND > 0:
+        if _global is None:
+            _global = TokenBucket(RATE_LIMIT_GLOBAL_PER_SECOND, RATE_LIMIT_GLOBAL_BURST, now)
+        wait = _global.wait_time(now)
+        if wait > 0:
+            _refuse(429, "global_rate", "Too many submissions right now, please try again shortly", wait)
+        _global.take()
+    if client_bucket is not None:
+        client_bucket.take()
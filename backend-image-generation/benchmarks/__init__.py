@@ -0,0 +1,13 @@
+"""Offline microbenchmarks for the submission pipeline.
+
+Run ``python -m benchmarks`` from backend-image-generation/ to time every
+stage and compare it with baseline.json; ``--save-baseline`` records a new one.
+"""
+import os
+import sys
+
+# The service imports the shared package, which sits next to it in the image (/app/shared)
+# but at the repository root in a checkout
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if os.path.isdir(os.path.join(_REPO_ROOT, "shared")) and _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
@@ -0,0 +1,18 @@
+# Fixed inputs so runs are comparable; paragraphs are separated by a literal \n as typed in the form
+QUOTES = {
+    "short": "Some words are left behind on purpose.",
+    "long": (
+        "I kept every letter you never sent, folded into the pages of books I will never finish, "
+        "because somewhere between the lines I still hear the way you said my name when the train "
+        "pulled away and neither of us knew it would be the last time. The station is quieter now, "
+        "the benches have been painted twice, and the clock above platform four still runs two "
+        "minutes late, as if it too is waiting for someone to come back and set it right again."
+    ),
+    "multi_paragraph": (
+        "To the version of me who stayed:\\n"
+        "I hope the garden grew the way we planned it.\\n"
+        "I hope you learned to sleep through the thunder and to forgive the people who left "
+        "without saying goodbye.\\n"
+        "Mostly I hope you still write things down."
+    ),
+}
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import sys
+import threading
+import time
+
+import PIL
+
+import storage
+from benchmarks.fixtures import QUOTES
+from benchmarks.standins import use_memory_storage
+from utils.encoding import encode_renditions
+from utils.layout import FONT_SIZES, preload_fonts
+from utils.render import TEXT_MARGIN, add_text_to_image_and_save_as_webp, render_quote
+from utils.templates import get_template, refresh_templates, template_names
+from utils.validate_message import is_message_valid
+from utils.wrap_text import adjust_text_for_image
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+# p50 may grow by this fraction over the baseline before a stage counts as a regression;
+# generous because shared CI machines vary by ±25% between runs
+DEFAULT_TOLERANCE = 0.5
+# Cheap stages repeat their fixtures until they have this many samples; expensive ones run each fixture once
+DEFAULT_MIN_RUNS = 100
+# Timings are only comparable with a baseline recorded where these match
+ENVIRONMENT_KEYS = ("python", "pillow", "machine", "cpu_count")
+
+
+def _percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def _rss_bytes():
+    """Resident set size of this process, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def _rss_growth(func, cases: list):
+    """Peak RSS growth over one pass of cases, sampled every millisecond.
+
+    Unlike tracemalloc this sees Pillow's native image buffers. Memory the
+    allocator kept from earlier passes is reused without growing RSS, so
+    this is a lower bound.
+    """
+    start = _rss_bytes()
+    if start is None:
+        return None
+    peak = start
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, _rss_bytes())
+            time.sleep(0.001)
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    try:
+        for case in cases:
+            func(*case)
+    finally:
+        done.set()
+        sampler.join()
+    return max(peak, _rss_bytes()) - start
+
+
+def _measure(func, cases: list, min_runs: int) -> dict:
+    """Time func(*case) over whole passes of cases until min_runs samples are taken.
+
+    Memory comes from one extra pass with an RSS sampler, so sampling does not skew the timings.
+    """
+    samples = []
+    started = time.perf_counter()
+    for _ in range(max(1, math.ceil(min_runs / len(cases)))):
+        for case in cases:
+            t0 = time.perf_counter()
+            func(*case)
+            samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    growth = _rss_growth(func, cases)
+    return {
+        "runs": len(samples),
+        "ops_per_sec": round(len(samples) / elapsed, 2),
+        "p50_ms": round(_percentile(samples, 0.50) * 1000, 3),
+        "p99_ms": round(_percentile(samples, 0.99) * 1000, 3),
+        "rss_growth_kib": round(growth / 1024, 1) if growth is not None else None,
+    }
+
+
+def run_benchmarks(min_runs: int = DEFAULT_MIN_RUNS) -> dict:
+    refresh_templates(force=True)
+    preload_fonts()
+    templates = template_names()
+    texts = list(QUOTES.values())
+    combos = [(text, name) for text in texts for name in templates]
+
+    # Rendered canvases reused by the encode and upload stages, so those time only their own work
+    images = [render_quote(text, name) for text, name in combos]
+    renditions = [encode_renditions(image) for image in images]
+
+    sink = use_memory_storage()
+    loop = asyncio.new_event_loop()
+
+    def upload(rendition_set, index):
+        loop.run_until_complete(storage.upload_renditions(dict(rendition_set), key_prefix=f"bench-{index}"))
+
+    def render_and_encode(text):
+        random.seed(0)  # the legacy helper picks a random template
+        add_text_to_image_and_save_as_webp(text)
+
+    box_width = get_template(templates[0]).width - 2 * TEXT_MARGIN
+    stages = {
+        "validate": (is_message_valid, [(text,) for text in texts]),
+        "wrap": (adjust_text_for_image, [(text, box_width, size) for text in texts for size in FONT_SIZES]),
+        "render": (render_quote, combos),
+        "encode": (encode_renditions, [(image,) for image in images]),
+        "render_and_encode": (render_and_encode, [(text,) for text in texts]),
+        "upload": (upload, [(rendition_set, i) for i, rendition_set in enumerate(renditions)]),
+    }
+    try:
+        results = {name: _measure(func, cases, min_runs) for name, (func, cases) in stages.items()}
+    finally:
+        loop.close()
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "templates": len(templates),
+            "uploaded_bytes": sink.bytes,
+        },
+        "stages": results,
+    }
+
+
+def environment_mismatch(results: dict, baseline: dict) -> list:
+    """(key, baseline value, current value) for every ENVIRONMENT_KEYS entry that differs."""
+    current, recorded = results["environment"], baseline.get("environment", {})
+    return [(key, recorded.get(key), current.get(key)) for key in ENVIRONMENT_KEYS
+            if recorded.get(key) != current.get(key)]
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Names and slowdowns of stages whose p50 grew by more than tolerance."""
+    regressions = []
+    for name, stage in results["stages"].items():
+        reference = baseline.get("stages", {}).get(name)
+        if not reference or not reference["p50_ms"]:
+            continue
+        ratio = stage["p50_ms"] / reference["p50_ms"]
+        if ratio > 1 + tolerance:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def print_table(results: dict, baseline: dict = None):
+    print(f"{'stage':<20}{'runs':>6}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'RSS+ KiB':>11}{'vs base':>9}")
+    for name, stage in results["stages"].items():
+        reference = (baseline or {}).get("stages", {}).get(name)
+        change = f"{stage['p50_ms'] / reference['p50_ms'] - 1:+.0%}" if reference and reference["p50_ms"] else "-"
+        print(f"{name:<20}{stage['runs']:>6}{stage['ops_per_sec']:>10}{stage['p50_ms']:>10}"
+              f"{stage['p99_ms']:>10}{str(stage['rss_growth_kib']):>11}{change:>9}")
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Time each pipeline stage offline.")
+    parser.add_argument("--min-runs", type=int, default=DEFAULT_MIN_RUNS, help="samples per stage, at least")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--ignore-environment", action="store_true",
+                        help="compare even if the baseline was recorded on another machine or versions")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.min_runs)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print("No baseline to compare with; run with --save-baseline to record one.")
+        return 0
+    mismatch = environment_mismatch(results, baseline)
+    for key, recorded, current in mismatch:
+        print(f"WARNING baseline {key} is {recorded}, this run has {current}")
+    if mismatch and not args.ignore_environment:
+        print("Timings are not comparable; record a baseline here with --save-baseline, "
+              "or pass --ignore-environment.")
+        return 2
+    regressions = compare(results, baseline, args.tolerance)
+    for name, ratio in regressions:
+        print(f"REGRESSION {name}: p50 is {ratio:.2f}x the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
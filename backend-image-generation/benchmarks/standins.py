@@ -0,0 +1,25 @@
+"""In-memory stand-in for MinIO, shared by the benchmarks and the load-test harness."""
+import threading
+
+import storage
+
+
+class MemorySink:
+    """Takes the place of storage.minio_client: object sizes are kept in memory and counted."""
+
+    def __init__(self):
+        self.objects = {}
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def put_object(self, bucket_name, object_name, data, length, content_type=None, metadata=None, **kwargs):
+        payload = data.read(length)
+        with self._lock:
+            self.objects[(bucket_name, object_name)] = len(payload)
+            self.bytes += len(payload)
+
+
+def use_memory_storage() -> MemorySink:
+    """Send every upload of this process to a new MemorySink and return it."""
+    sink = storage.minio_client = MemorySink()
+    return sink
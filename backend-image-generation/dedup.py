@@ -0,0 +1,52 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+from mongo import find_submission_by_render_hash
+
+# Recently stored renders, so retries and double-clicks skip even the Mongo lookup.
+# Kept short because admin deletes in another service cannot invalidate it.
+DEDUP_CACHE_SIZE = int(os.getenv("DEDUP_CACHE_SIZE", "1024"))
+DEDUP_CACHE_TTL = float(os.getenv("DEDUP_CACHE_TTL", "60"))
+
+_entries = OrderedDict()  # render hash -> (expires, result)
+
+# lookup() result for a render held by a submission moderators have hidden
+HIDDEN = object()
+
+
+def remember(render_hash: str, result: dict):
+    _entries[render_hash] = (time.monotonic() + DEDUP_CACHE_TTL, result)
+    _entries.move_to_end(render_hash)
+    while len(_entries) > DEDUP_CACHE_SIZE:
+        _entries.popitem(last=False)
+
+
+def submission_result(doc: dict) -> dict:
+    """Pipeline result for an already stored submission."""
+    return {
+        "image_url": doc["image_url"],
+        "thumbnail_url": doc.get("thumbnail_url", doc["image_url"]),
+        "renditions": {name: rendition["url"] for name, rendition in doc.get("renditions", {}).items()},
+        "submission_id": str(doc["_id"])
+    }
+
+
+async def lookup(render_hash: str):
+    """Result of the submission already holding this render, HIDDEN if that one is hidden, or None."""
+    entry = _entries.get(render_hash)
+    if entry is not None:
+        if entry[0] >= time.monotonic():
+            _entries.move_to_end(render_hash)
+            return entry[1]
+        del _entries[render_hash]
+
+    doc = await asyncio.to_thread(find_submission_by_render_hash, render_hash)
+    if doc is None:
+        return None
+    if doc.get("hidden"):
+        return HIDDEN
+    result = submission_result(doc)
+    remember(render_hash, result)
+    return result
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime
+
+from mongo import claim_job, fail_abandoned_jobs, release_job, update_job
+from pipeline import PipelineError, generate_submission
+from utils import render_pool
+
+logger = logging.getLogger("uvicorn")
+
+# Concurrent jobs pulled by each service process; defaults to the render pool size
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "0")) or render_pool.RENDER_WORKERS
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# A running job whose worker disappeared is retried after this many seconds
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Queued jobs allowed before new async submissions are refused
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "1000"))
+
+# Fraction of the work done when each stage starts, reported by the status endpoint
+STAGE_PROGRESS = {
+    "queued": 0.0,
+    "claimed": 0.1,
+    "rendering": 0.2,
+    "uploading": 0.7,
+    "saving": 0.9,
+    "done": 1.0,
+}
+
+_tasks = []
+_wakeup = None
+
+
+def notify_new_job():
+    """Wake the local workers instead of waiting for the next poll."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+async def _process(job: dict):
+    job_id = job["_id"]
+
+    async def on_stage(stage: str):
+        await asyncio.to_thread(update_job, job_id, stage=stage)
+
+    try:
+        result = await generate_submission(job["content"], on_stage=on_stage)
+    except render_pool.RenderQueueFull:
+        # Put the job back; it is picked up again once renders drain, and the bounce is not an attempt
+        await asyncio.to_thread(release_job, job_id)
+        await asyncio.sleep(render_pool.RENDER_RETRY_AFTER)
+        return
+    except PipelineError as e:
+        if job.get("attempts", 1) < JOB_MAX_ATTEMPTS:
+            await asyncio.to_thread(update_job, job_id, status="queued", stage="queued", error=e.detail)
+        else:
+            await asyncio.to_thread(
+                update_job, job_id, status="failed", stage=e.stage, error=e.detail, finished_at=datetime.utcnow()
+            )
+        return
+
+    await asyncio.to_thread(
+        update_job, job_id,
+        status="done",
+        stage="done",
+        image_url=result["image_url"],
+        thumbnail_url=result["thumbnail_url"],
+        renditions=result["renditions"],
+        submission_id=result["submission_id"],
+        finished_at=datetime.utcnow()
+    )
+
+
+async def _worker(worker_id: str):
+    while True:
+        try:
+            job = await asyncio.to_thread(claim_job, worker_id, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS)
+        except Exception as e:
+            logger.error(f"Job worker {worker_id} failed to claim a job: {str(e)}")
+            job = None
+
+        if job is None:
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        try:
+            await _process(job)
+        except Exception as e:
+            logger.error(f"Job {job['_id']} crashed: {str(e)}")
+
+
+async def _reaper():
+    # Jobs that never finished within JOB_MAX_ATTEMPTS leases are failed instead of reclaimed
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS)
+        try:
+            failed = await asyncio.to_thread(fail_abandoned_jobs, JOB_MAX_ATTEMPTS)
+            if failed:
+                logger.warning(f"Marked {failed} abandoned job(s) failed after {JOB_MAX_ATTEMPTS} attempts")
+        except Exception as e:
+            logger.error(f"Job reaper error: {str(e)}")
+
+
+def start():
+    global _wakeup
+    _wakeup = asyncio.Event()
+    prefix = uuid.uuid4().hex[:8]
+    for i in range(JOB_WORKERS):
+        _tasks.append(asyncio.create_task(_worker(f"{prefix}-{i}")))
+    _tasks.append(asyncio.create_task(_reaper()))
+    logger.info(f"Started {JOB_WORKERS} job worker(s)")
+
+
+async def stop():
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+
+
+def job_status(job: dict) -> dict:
+    """Public view of a job document for the status endpoint."""
+    stage = job.get("stage", "queued")
+    status = {
+        "job_id": str(job["_id"]),
+        "status": job["status"],
+        "stage": stage,
+        "progress": STAGE_PROGRESS.get(stage, 0.0),
+    }
+    if job["status"] == "done":
+        status["image_url"] = job.get("image_url")
+        status["thumbnail_url"] = job.get("thumbnail_url")
+        status["renditions"] = job.get("renditions", {})
+        status["submission_id"] = job.get("submission_id")
+    elif job["status"] == "failed":
+        status["error"] = job.get("error")
+    return status
@@ -1,46 +1,62 @@
+import asyncio
 import logging
 import os
-import random
-import uuid
-from io import BytesIO
-import time
-import requests
-from PIL import Image, ImageDraw, ImageFont
-from fastapi import FastAPI, APIRouter, HTTPException
+from contextlib import asynccontextmanager
+
+from bson import ObjectId
+from fastapi import FastAPI, APIRouter, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from minio import Minio
 from pydantic import BaseModel
 
-from mongo import save_submission
-from utils.validate_message import is_message_valid
-from utils.wrap_text import adjust_text_for_image
+import admission
+import jobs
+import slack_outbox
+import mongo
+from mongo import count_queued_jobs, create_job, get_job
+from pipeline import PipelineError, generate_submission
+from shared import metrics, profiling
+from shared.indexes import ensure_indexes
+from utils import render_pool
+from utils.validate_message import RULES, MessageRejected, is_message_valid, validate_messages
+
+logger = logging.getLogger("uvicorn")
+
+
+async def _bootstrap_indexes():
+    try:
+        await asyncio.to_thread(ensure_indexes, mongo.db)
+    except Exception as e:
+        logger.error(f"Index bootstrap failed: {str(e)}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing here waits on MongoDB; the client connects on first use
+    index_task = asyncio.create_task(_bootstrap_indexes())
+    # Render workers warm their template and font caches as they start
+    await render_pool.start()
+    slack_outbox.start()
+    jobs.start()
+    yield
+    await jobs.stop()
+    await slack_outbox.stop()
+    render_pool.shutdown()
+    index_task.cancel()
+
 
 app = FastAPI(
     docs_url=None,
     redoc_url=None,
-    openapi_url=None
+    openapi_url=None,
+    lifespan=lifespan
 )
 
-logger = logging.getLogger("uvicorn")
 api_router = APIRouter()
 
 # Environment variables
-SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK")
-MINIO_URL = os.getenv("MINIO_URL", "minio:9000")
-MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "muki")
-MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "kenomuki")
-MINIO_BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "thumbnails")
-FONT_PATH = os.getenv("FONT_PATH", "ReenieBeanie-Regular.ttf")
 ENVIRONMENT = os.getenv("ENVIRONMENT", "")
-
-# Minio client
-minio_client = Minio(
-    MINIO_URL,
-    access_key=MINIO_ACCESS_KEY,
-    secret_key=MINIO_SECRET_KEY,
-    secure=(ENVIRONMENT != "local"),
-)
+MAX_VALIDATE_BATCH = int(os.getenv("MAX_VALIDATE_BATCH", "5000"))
 
 
 class Message(BaseModel):
@@ -58,6 +74,10 @@ class Message(BaseModel):
         return is_message_valid(v)
 
 
+class MessageBatch(BaseModel):
+    messages: list[str]
+
+
 if ENVIRONMENT == "local":
     origins = ["*"]
 else:
@@ -70,94 +90,8 @@ app.add_middleware(
     allow_methods=["POST", "GET"],
     allow_headers=["*"],
 )
-
-def add_text_to_image_and_save_as_webp(text: str) -> BytesIO:
-    color_folder = "white"
-    image_dir = os.path.join("images", color_folder)
-    image_files = [f for f in os.listdir(image_dir) if f.lower().endswith((".png", ".jpg", ".jpeg"))]
-
-    if not image_files:
-        raise FileNotFoundError(f"No images found in '{image_dir}'.")
-
-    chosen_image_path = os.path.join(image_dir, random.choice(image_files))
-    image = Image.open(chosen_image_path).convert("RGB")
-
-    # Apply dark overlay to make text more readable
-    overlay = Image.new("RGB", image.size, (0, 0, 0))
-    image = Image.blend(image, overlay, alpha=0.3)
-
-    draw = ImageDraw.Draw(image)
-
-    try:
-        font = ImageFont.truetype(FONT_PATH, size=65)
-        watermark_font = ImageFont.truetype(FONT_PATH, size=30)  # smaller font for watermark
-    except IOError:
-        font = ImageFont.load_default()
-        watermark_font = font
-
-    lines = adjust_text_for_image(text, max_width=20, font=font, draw=draw)
-
-    # Centered vertical layout
-    line_height = font.getbbox("A")[3] - font.getbbox("A")[1]
-    line_spacing = int(line_height * 1.2)  # adjust multiplier as needed
-
-    total_height = line_spacing * len(lines)
-
-    y_text = (image.height - total_height) // 2
-
-    text_color = "white" if color_folder == "white" else "black"
-
-    for line in lines:
-        line_width = draw.textlength(line, font=font)
-        x_text = (image.width - line_width) // 2
-        draw.text((x_text, y_text), line, font=font, fill=text_color)
-        y_text += line_spacing
-
-    # Add watermark at bottom center
-    watermark_text = "@the_words_left_behind"
-    watermark_color = (0, 0, 0, 230) if color_folder == "black" else (255, 255, 255, 230)
-
-    # Create transparent layer for watermark
-    watermark_layer = Image.new("RGBA", image.size, (0, 0, 0, 0))
-    watermark_draw = ImageDraw.Draw(watermark_layer)
-
-    watermark_width = watermark_draw.textlength(watermark_text, font=watermark_font)
-    x_watermark = (image.width - watermark_width) // 2
-    y_watermark = image.height - 100  # margin from bottom
-
-    watermark_draw.text((x_watermark, y_watermark), watermark_text, font=watermark_font, fill=watermark_color)
-
-    # Merge watermark layer
-    image = image.convert("RGBA")
-    image = Image.alpha_composite(image, watermark_layer)
-
-    # Save the image directly as WebP
-    img_io = BytesIO()
-    image.save(img_io, format="WEBP", quality=100, method=6, lossless=False)
-    img_io.seek(0)
-    return img_io
-
-
-def upload_image_to_minio(image_io: BytesIO, filename: str, bucket_name: str, content_type: str) -> str:
-    # Adjust the Minio URL based on the environment when returning the image URL
-    if ENVIRONMENT == "local":
-        minio_url = "localhost:9000"  # Local Minio URL
-    else:
-        minio_url = "minio.thewordsleftbehind.com"  # Production Minio URL
-
-    # Upload the image to Minio
-    minio_client.put_object(
-        bucket_name,
-        filename,
-        image_io,
-        len(image_io.getvalue()),
-        content_type
-    )
-
-    if ENVIRONMENT == "local":
-        return f"http://{minio_url}/{bucket_name}/{filename}"
-    else:
-        return f"https://{minio_url}/{bucket_name}/{filename}"  # Return HTTPS URL in production
+metrics.instrument(app)
+profiling.instrument(app, prefix="/api/generate")
 
 
 # Health check
@@ -166,82 +100,115 @@ async def health():
     return {"status": "ok"}
 
 
-# Submit message and generate image
-import time  # Add this at the top if not already imported
+@api_router.get("/ready", response_class=JSONResponse)
+async def ready():
+    # Readiness probe: only report ready while MongoDB answers a ping and the render pool can take work
+    mongo_ok = await asyncio.to_thread(mongo.ping)
+    render_pool_ok = render_pool.healthy()
+    if not (mongo_ok and render_pool_ok):
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "mongo": mongo_ok, "render_pool": render_pool_ok}
+        )
+    return {"status": "ok", "mongo": True, "render_pool": True}
+
 
+# Submit message and generate image
 @api_router.post("/submit-message")
-async def submit_post(message: Message):
-    start_total = time.time()
+async def submit_post(message: Message, request: Request, mode: str = "sync", x_real_ip: str = Header(None)):
+    if mode not in ["sync", "async"]:
+        raise HTTPException(status_code=400, detail="Invalid mode parameter. Must be 'sync' or 'async'.")
 
-    if not SLACK_WEBHOOK_URL:
-        logger.error("Slack webhook URL is not set in the environment.")
-        raise HTTPException(status_code=500, detail="Slack webhook URL not set in environment")
+    # Rate limits and load shedding, before any validation or rendering work
+    client = x_real_ip or (request.client.host if request.client else "unknown")
+    try:
+        admission.admit(client, renders=(mode == "sync"))
+    except admission.Refused as e:
+        logger.warning(f"Refusing submission from {client}: {e.reason}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
 
     # Validation
-    validate_start = time.time()
-    if not Message.validate_content(message.content):
-        logger.warning("Invalid message submitted")
-        raise HTTPException(status_code=400, detail="Invalid message")
-    validate_end = time.time()
-    logger.info(f"[TIMING] Message validation: {validate_end - validate_start:.3f}s")
-
-    # Slack notification (only if not local)
-    slack_start = time.time()
-    if ENVIRONMENT != "local":
-        slack_payload = {
-            "text": ":new: :tada: New submit: \n" + message.content
-        }
+    try:
+        with metrics.time_stage("validate"):
+            Message.validate_content(message.content)
+    except MessageRejected as e:
+        logger.warning(f"Invalid message submitted: {e.rule}")
+        raise HTTPException(status_code=400, detail={"rule": e.rule, "message": str(e)})
+
+    # Async mode: persist a job for the render workers and answer immediately
+    if mode == "async":
         try:
-            response = requests.post(SLACK_WEBHOOK_URL, json=slack_payload)
-            if response.status_code != 200:
-                logger.error(f"Failed to send message to Slack: {response.text}")
-                return JSONResponse(content={"status": "Failed to send message to Slack", "error": response.text},
-                                    status_code=500)
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error while sending message to Slack: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Failed to send message to Slack: {str(e)}")
-    slack_end = time.time()
-    logger.info(f"[TIMING] Slack webhook: {slack_end - slack_start:.3f}s")
-
-    # Image generation
-    gen_start = time.time()
+            if await asyncio.to_thread(count_queued_jobs) >= jobs.JOB_QUEUE_LIMIT:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many pending submissions, please try again shortly",
+                    headers={"Retry-After": str(render_pool.RENDER_RETRY_AFTER)}
+                )
+            job_id = await asyncio.to_thread(create_job, message.content)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Job creation failed: {str(e)}")
+            raise HTTPException(status_code=500, detail="Submission save failed")
+        jobs.notify_new_job()
+        return JSONResponse(
+            status_code=202,
+            content={
+                "status": "accepted",
+                "job_id": str(job_id),
+                "status_url": f"/api/generate/jobs/{job_id}"
+            }
+        )
+
     try:
-        unique_id = uuid.uuid4()
-        filename = f"{unique_id}.webp"
-        img_io = add_text_to_image_and_save_as_webp(message.content)
-    except Exception as e:
-        logger.error(f"Image generation failed: {str(e)}")
-        raise HTTPException(status_code=500, detail="Image generation failed")
-    gen_end = time.time()
-    logger.info(f"[TIMING] Image generation: {gen_end - gen_start:.3f}s")
+        result = await generate_submission(message.content)
+    except render_pool.RenderQueueFull as e:
+        logger.warning(f"Rejecting submission: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail="Image generation is busy, please try again shortly",
+            headers={"Retry-After": str(render_pool.RENDER_RETRY_AFTER)}
+        )
+    except PipelineError as e:
+        raise HTTPException(status_code=500, detail=e.detail)
+
+    return JSONResponse(
+        content={"status": "success", **result}
+    )
 
-    # Upload to MinIO
-    upload_start = time.time()
+
+# Validate many messages at once, for bulk imports and moderation tools
+@api_router.post("/validate")
+async def validate_batch(batch: MessageBatch):
+    if len(batch.messages) > MAX_VALIDATE_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_VALIDATE_BATCH} messages per request")
+    rules = await asyncio.to_thread(validate_messages, batch.messages)
+    return {
+        "results": [
+            {"valid": rule is None, "rule": rule, "message": RULES.get(rule)}
+            for rule in rules
+        ]
+    }
+
+
+# Status of an asynchronous submission
+@api_router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
     try:
-        full_size_url = upload_image_to_minio(img_io, filename, MINIO_BUCKET_NAME, content_type="image/webp")
-    except Exception as e:
-        logger.error(f"MinIO upload failed: {str(e)}")
-        raise HTTPException(status_code=500, detail="Image upload failed")
-    upload_end = time.time()
-    logger.info(f"[TIMING] MinIO upload: {upload_end - upload_start:.3f}s")
+        obj_id = ObjectId(job_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid job_id format.")
 
-    # Save to Mongo
-    db_start = time.time()
     try:
-        submission_id = save_submission(full_size_url)
+        job = await asyncio.to_thread(get_job, obj_id)
     except Exception as e:
-        logger.error(f"MongoDB save failed: {str(e)}")
-        raise HTTPException(status_code=500, detail="Submission save failed")
-    db_end = time.time()
-    logger.info(f"[TIMING] MongoDB save: {db_end - db_start:.3f}s")
+        logger.error(f"Error fetching job: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch job")
 
-    total_end = time.time()
-    logger.info(f"[TIMING] Total request time: {total_end - start_total:.3f}s")
-
-    return JSONResponse(
-        content={"status": "success", "image_url": full_size_url, "submission_id": str(submission_id)}
-    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
 
+    return JSONResponse(content=jobs.job_status(job))
 
 
 app.include_router(api_router, prefix="/api/generate")
@@ -0,0 +1,11 @@
+"""Batched, resumable data migrations, applied in the order listed here.
+
+Run ``python -m migrations`` to apply every migration that has not completed.
+"""
+from migrations.backfill_object_keys import BackfillObjectKeys
+from migrations.backfill_usernames import BackfillUsernames
+
+MIGRATIONS = [
+    BackfillUsernames(),
+    BackfillObjectKeys(),
+]
@@ -0,0 +1,44 @@
+import argparse
+import logging
+import sys
+
+from migrations import MIGRATIONS
+from migrations.runner import MIGRATION_BATCH_SIZE, MIGRATION_WORKERS, is_complete, run
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m migrations", description="Apply data migrations.")
+    parser.add_argument("names", nargs="*", help="migrations to run (default: every incomplete one)")
+    parser.add_argument("--workers", type=int, default=MIGRATION_WORKERS, help="parallel _id ranges")
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="discard checkpoints and start over")
+    parser.add_argument("--list", action="store_true", help="show migrations and their status")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    by_name = {migration.name: migration for migration in MIGRATIONS}
+
+    if args.list:
+        for migration in MIGRATIONS:
+            print(f"{migration.name}: {'complete' if is_complete(migration) else 'pending'}")
+        return 0
+
+    unknown = [name for name in args.names if name not in by_name]
+    if unknown:
+        print(f"Unknown migration(s): {', '.join(unknown)}")
+        return 2
+
+    if args.names:
+        selected = [by_name[name] for name in args.names]
+    else:
+        selected = [migration for migration in MIGRATIONS if args.restart or not is_complete(migration)]
+
+    for migration in selected:
+        result = run(migration, workers=args.workers, batch_size=args.batch_size, restart=args.restart)
+        print(f"{migration.name}: {result['processed']} processed, {result['modified']} modified, "
+              f"{result['failed']} failed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
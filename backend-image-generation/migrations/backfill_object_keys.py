@@ -0,0 +1,28 @@
+from urllib.parse import urlparse
+
+from pymongo import UpdateOne
+
+from migrations.runner import Migration
+from storage import MINIO_BUCKET_NAME
+
+
+def stored_object_keys(doc: dict) -> list:
+    """Keys in MINIO_BUCKET_NAME referenced by a submission's renditions or URLs."""
+    keys = {rendition["key"] for rendition in (doc.get("renditions") or {}).values() if rendition.get("key")}
+    for field in ("image_url", "thumbnail_url"):
+        # Older submissions only recorded URLs of the form .../<bucket>/<key>
+        parts = urlparse(doc.get(field) or "").path.lstrip("/").split("/", 1)
+        if len(parts) == 2 and parts[0] == MINIO_BUCKET_NAME and parts[1]:
+            keys.add(parts[1])
+    return sorted(keys)
+
+
+class BackfillObjectKeys(Migration):
+    """Record the flat object_keys list on submissions saved before it existed."""
+    name = "0002_backfill_object_keys"
+    collection = "submissions"
+    query = {"object_keys": {"$exists": False}}
+    projection = {"renditions": 1, "image_url": 1, "thumbnail_url": 1}
+
+    def operations(self, docs: list) -> list:
+        return [UpdateOne({"_id": doc["_id"]}, {"$set": {"object_keys": stored_object_keys(doc)}}) for doc in docs]
@@ -0,0 +1,15 @@
+from pymongo import UpdateOne
+
+from migrations.runner import Migration
+from shared.usernames import random_username
+
+
+class BackfillUsernames(Migration):
+    """Give every submission without a username a random anonymous one."""
+    name = "0001_backfill_usernames"
+    collection = "submissions"
+    query = {"username": {"$in": [None, ""]}}
+    projection = {"_id": 1}
+
+    def operations(self, docs: list) -> list:
+        return [UpdateOne({"_id": doc["_id"]}, {"$set": {"username": random_username()}}) for doc in docs]
@@ -0,0 +1,238 @@
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+
+from shared.db import get_db
+
+logger = logging.getLogger("uvicorn")
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+MIGRATION_WORKERS = int(os.getenv("MIGRATION_WORKERS", "1"))
+MIGRATION_REPORT_SECONDS = float(os.getenv("MIGRATION_REPORT_SECONDS", "5"))
+
+# One document per migration (its id ranges and status) and one per range (its checkpoint)
+CHECKPOINT_COLLECTION = "migrations"
+
+
+class Migration:
+    """A data migration applied to one collection in _id order.
+
+    Subclasses set name, and optionally collection, query and projection,
+    and turn each batch of matching documents into bulk write operations.
+    """
+    name = ""
+    collection = "submissions"
+    query = {}
+    projection = None
+
+    def operations(self, docs: list) -> list:
+        raise NotImplementedError
+
+
+class _Progress:
+    def __init__(self, name: str, total: int):
+        self.name = name
+        self.total = total
+        self.processed = 0
+        self.modified = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, processed: int, modified: int, failed: int):
+        with self.lock:
+            self.processed += processed
+            self.modified += modified
+            self.failed += failed
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - self.processed, 0)
+        eta = f"{remaining / rate:.0f}s" if rate > 0 else "unknown"
+        logger.info(
+            f"[{self.name}] {self.processed}/{self.total} docs, {self.modified} modified, "
+            f"{self.failed} failed, {rate:.0f} docs/s, ETA {eta}"
+        )
+
+
+def _oid_int(obj_id: ObjectId) -> int:
+    return int.from_bytes(obj_id.binary, "big")
+
+
+def _split_ranges(collection, query: dict, workers: int) -> list:
+    """Split the _id span of the matching documents into equal [lower, upper) ranges."""
+    first = collection.find_one(query, {"_id": 1}, sort=[("_id", ASCENDING)])
+    if first is None:
+        return []
+    last = collection.find_one(query, {"_id": 1}, sort=[("_id", DESCENDING)])
+    if workers <= 1 or not isinstance(first["_id"], ObjectId) or not isinstance(last["_id"], ObjectId):
+        return [(None, None)]
+
+    low, high = _oid_int(first["_id"]), _oid_int(last["_id"]) + 1
+    step = max(math.ceil((high - low) / workers), 1)
+    bounds = [ObjectId((low + step * i).to_bytes(12, "big")) for i in range(1, workers) if low + step * i < high]
+    edges = [None] + bounds + [None]
+    return list(zip(edges, edges[1:]))
+
+
+def _range_filter(query: dict, lower, upper, last_id) -> dict:
+    id_filter = {}
+    if last_id is not None:
+        id_filter["$gt"] = last_id
+    elif lower is not None:
+        id_filter["$gte"] = lower
+    if upper is not None:
+        id_filter["$lt"] = upper
+    return {**query, "_id": id_filter} if id_filter else dict(query)
+
+
+def _run_range(migration: Migration, checkpoint_id: str, batch_size: int, progress: _Progress):
+    db = get_db()
+    collection = db[migration.collection]
+    checkpoints = db[CHECKPOINT_COLLECTION]
+    checkpoint = checkpoints.find_one({"_id": checkpoint_id})
+    if checkpoint.get("done"):
+        return
+
+    last_id = checkpoint.get("last_id")
+    while True:
+        # A fresh query per batch, so no cursor stays open long enough to time out
+        docs = list(
+            collection.find(_range_filter(migration.query, checkpoint["lower"], checkpoint["upper"], last_id),
+                            migration.projection)
+            .sort("_id", ASCENDING)
+            .limit(batch_size)
+        )
+        if not docs:
+            break
+
+        modified = failed = 0
+        operations = migration.operations(docs)
+        if operations:
+            try:
+                result = collection.bulk_write(operations, ordered=False)
+                modified = result.modified_count
+            except BulkWriteError as e:
+                failed = len(e.details.get("writeErrors", []))
+                modified = e.details.get("nModified", 0)
+                logger.error(f"[{migration.name}] {failed} of {len(operations)} write(s) failed in batch after {last_id}")
+
+        last_id = docs[-1]["_id"]
+        checkpoints.update_one(
+            {"_id": checkpoint_id},
+            {
+                "$set": {"last_id": last_id, "updated_at": datetime.utcnow()},
+                "$inc": {"processed": len(docs), "modified": modified, "failed": failed}
+            }
+        )
+        progress.add(len(docs), modified, failed)
+
+    checkpoints.update_one({"_id": checkpoint_id}, {"$set": {"done": True, "updated_at": datetime.utcnow()}})
+
+
+def _prepare(migration: Migration, workers: int, restart: bool) -> list:
+    """Return the checkpoint ids of the migration, creating them on the first run.
+
+    Every write here is an upsert that only sets fields on insert, so a run
+    interrupted at any point is resumed by the next one. The state document
+    holds the range bounds; whichever run stored them first wins.
+    """
+    db = get_db()
+    checkpoints = db[CHECKPOINT_COLLECTION]
+    if restart:
+        checkpoints.delete_many({"migration": migration.name})
+        checkpoints.delete_one({"_id": migration.name})
+
+    state = checkpoints.find_one({"_id": migration.name})
+    if state is None:
+        ranges = _split_ranges(db[migration.collection], migration.query, workers)
+        checkpoints.update_one(
+            {"_id": migration.name},
+            {"$setOnInsert": {
+                "ranges": len(ranges),
+                "bounds": [list(bounds) for bounds in ranges],
+                "status": "running",
+                "started_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+        state = checkpoints.find_one({"_id": migration.name})
+    elif state["ranges"] != workers:
+        logger.info(f"[{migration.name}] resuming with the {state['ranges']} range(s) of the interrupted run")
+
+    checkpoint_ids = [f"{migration.name}:{i}" for i in range(state["ranges"])]
+    now = datetime.utcnow()
+    # One per range, at most MIGRATION_WORKERS; state documents from before bounds were stored have them all
+    for checkpoint_id, (lower, upper) in zip(checkpoint_ids, state.get("bounds", [])):
+        checkpoints.update_one(
+            {"_id": checkpoint_id},
+            {"$setOnInsert": {
+                "migration": migration.name,
+                "lower": lower,
+                "upper": upper,
+                "last_id": None,
+                "processed": 0,
+                "modified": 0,
+                "failed": 0,
+                "done": False,
+                "updated_at": now
+            }},
+            upsert=True
+        )
+    return checkpoint_ids
+
+
+def _remaining(migration: Migration, checkpoint_ids: list) -> int:
+    db = get_db()
+    total = 0
+    for checkpoint in db[CHECKPOINT_COLLECTION].find({"_id": {"$in": checkpoint_ids}, "done": False}):
+        query = _range_filter(migration.query, checkpoint["lower"], checkpoint["upper"], checkpoint["last_id"])
+        total += db[migration.collection].count_documents(query)
+    return total
+
+
+def is_complete(migration: Migration) -> bool:
+    state = get_db()[CHECKPOINT_COLLECTION].find_one({"_id": migration.name}, {"status": 1})
+    return state is not None and state.get("status") == "complete"
+
+
+def run(migration: Migration, workers: int = MIGRATION_WORKERS, batch_size: int = MIGRATION_BATCH_SIZE,
+        restart: bool = False) -> dict:
+    """Apply a migration, resuming from its checkpoints if a previous run was interrupted."""
+    checkpoint_ids = _prepare(migration, workers, restart)
+    progress = _Progress(migration.name, _remaining(migration, checkpoint_ids))
+    logger.info(f"[{migration.name}] {progress.total} document(s) to process in {len(checkpoint_ids)} range(s)")
+
+    finished = threading.Event()
+
+    def report():
+        while not finished.wait(MIGRATION_REPORT_SECONDS):
+            progress.report()
+
+    reporter = threading.Thread(target=report, daemon=True)
+    reporter.start()
+    try:
+        with ThreadPoolExecutor(max_workers=max(len(checkpoint_ids), 1)) as executor:
+            futures = [executor.submit(_run_range, migration, checkpoint_id, batch_size, progress)
+                       for checkpoint_id in checkpoint_ids]
+            for future in futures:
+                future.result()
+    finally:
+        finished.set()
+        reporter.join()
+        progress.report()
+
+    get_db()[CHECKPOINT_COLLECTION].update_one(
+        {"_id": migration.name},
+        {"$set": {"status": "complete", "finished_at": datetime.utcnow()}}
+    )
+    return {"processed": progress.processed, "modified": progress.modified, "failed": progress.failed}
@@ -1,85 +1,150 @@
-import os
-from pymongo import MongoClient
-from datetime import datetime
-import random
-# Environment variables
-MONGO_HOST = os.getenv("MONGO_HOST", "mongo")
-MONGO_PORT = os.getenv("MONGO_PORT", "27017")
-MONGO_DB = os.getenv("MONGO_DB", "images")
-MONGO_USER = os.getenv("MONGO_USER", "mongo")
-MONGO_PASSWORD = os.getenv("MONGO_PASSWORD", "kenomuki")
-
-# MongoDB connection URI
-MONGO_URI = f"mongodb://{MONGO_USER}:{MONGO_PASSWORD}@{MONGO_HOST}:{MONGO_PORT}/{MONGO_DB}?authSource=admin"
-
-# Initialize MongoDB client
-client = MongoClient(MONGO_URI)
-db = client[MONGO_DB]
-submissions_collection = db.submissions  # Create a collection named 'submissions'
-
-anonymous_alternatives = [
-    "someone_like_you",
-    "quiet_soul",
-    "passing_thought",
-    "unknown_voice",
-    "from_the_void",
-    "left_unsaid",
-    "hidden_whisper",
-    "fleeting_echo",
-    "silent_presence",
-    "unseen_heart",
-    "secret_mind",
-    "wandering_voice",
-    "unspoken_truth",
-    "echo_in_the_dark",
-    "shadowed_words",
-    "forgotten_whisper",
-    "veiled_thought",
-    "unknown_presence",
-    "quiet_whisperer",
-    "unheard_soul",
-    "hidden_whisperer",
-    "unnoticed_thought",
-    "lost_voice",
-    "shadowy_mind",
-    "soft_echo",
-    "unseen_whisper",
-    "hidden_echo",
-    "passing_whisper",
-    "silent_thought",
-    "veiled_echo",
-    "unknown_murmur",
-    "secret_echo",
-    "wandering_mind",
-    "quiet_murmur",
-    "echo_of_silence",
-    "unnoticed_echo",
-    "shadow_whisper",
-    "unvoiced_message",
-    "subtle_presence",
-    "secret_whisperer",
-    "silent_whisper",
-    "unseen_echo",
-    "unknown_whisperer",
-    "quiet_signal",
-    "ghostly_message",
-    "elusive_voice",
-    "shadowed_echo",
-    "unseen_murmur",
-    "whispered_thought",
-    "quiet_echo"
-]
-
-def save_submission( image_url: str):
-    """Save the submission details into MongoDB."""
+from pymongo import ASCENDING, ReturnDocument
+from datetime import datetime, timedelta
+
+from shared.db import get_db, ping  # noqa: F401
+from shared.usernames import random_username
+
+
+def __getattr__(name):
+    # Resolved on first use so importing this module never touches the database
+    if name == "db":
+        return get_db()
+    if name == "submissions_collection":
+        return get_db().submissions  # Create a collection named 'submissions'
+    if name == "jobs_collection":
+        return get_db().jobs  # Asynchronous submission jobs
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def save_submission(renditions: dict, render_hash: str = None, notification: str = None):
+    """Save the submission details into MongoDB.
+
+    renditions maps rendition name to its uploaded "url" plus the encoder
+    metadata from utils.encoding; the encoded bytes themselves are not stored.
+    A notification text is stored in the same document as its outbox entry,
+    so the submission is never saved without it; slack_outbox delivers it.
+    """
     timestamp = datetime.utcnow()  # Current timestamp in UTC
     submission_data = {
-        "thumbnail_url": image_url,
+        "thumbnail_url": renditions["thumbnail"]["url"],
+        "image_url": renditions["full"]["url"],
+        "renditions": {
+            name: {
+                "url": rendition["url"],
+                "key": rendition["key"],
+                "bytes": len(rendition["data"]),
+                "content_type": rendition["content_type"],
+                "width": rendition["width"],
+                "height": rendition["height"]
+            }
+            for name, rendition in renditions.items()
+        },
+        # Flat list of every stored object, indexed for the storage reconciler
+        "object_keys": sorted({rendition["key"] for rendition in renditions.values()}),
         "timestamp": timestamp,
         "likes": 0,
-        "username": random.choice(anonymous_alternatives)
+        "username": random_username()
     }
+    if render_hash is not None:
+        submission_data["render_hash"] = render_hash
+    if notification is not None:
+        submission_data["notification"] = {
+            "text": notification,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": timestamp
+        }
 
     # Insert the submission data into MongoDB
-    result = submissions_collection.insert_one(submission_data)
+    result = get_db().submissions.insert_one(submission_data)
     return result.inserted_id
+
+
+def find_submission_by_render_hash(render_hash: str):
+    """The submission holding a render, visible or not; check "hidden" before returning it to anyone."""
+    return get_db().submissions.find_one(
+        {"render_hash": render_hash},
+        {"image_url": 1, "thumbnail_url": 1, "renditions": 1, "hidden": 1}
+    )
+
+
+def create_job(content: str):
+    """Persist a queued submission job and return its id."""
+    now = datetime.utcnow()
+    result = get_db().jobs.insert_one({
+        "content": content,
+        "status": "queued",
+        "stage": "queued",
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now
+    })
+    return result.inserted_id
+
+
+def count_queued_jobs() -> int:
+    return get_db().jobs.count_documents({"status": "queued"})
+
+
+def claim_job(worker_id: str, lease_seconds: int, max_attempts: int):
+    """Atomically take the oldest queued job, or a running job whose lease expired.
+
+    A job whose lease expired after max_attempts claims is left for
+    fail_abandoned_jobs, so one that crashes or hangs its worker is not
+    retried forever.
+    """
+    now = datetime.utcnow()
+    return get_db().jobs.find_one_and_update(
+        {"$or": [
+            {"status": "queued"},
+            {"status": "running", "lease_until": {"$lt": now}, "attempts": {"$lt": max_attempts}}
+        ]},
+        {
+            "$set": {
+                "status": "running",
+                "stage": "claimed",
+                "worker": worker_id,
+                "lease_until": now + timedelta(seconds=lease_seconds),
+                "updated_at": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def release_job(job_id):
+    """Put a claimed job back in the queue without counting the attempt."""
+    get_db().jobs.update_one(
+        {"_id": job_id},
+        {
+            "$set": {"status": "queued", "stage": "queued", "updated_at": datetime.utcnow()},
+            "$unset": {"worker": "", "lease_until": ""},
+            "$inc": {"attempts": -1}
+        }
+    )
+
+
+def fail_abandoned_jobs(max_attempts: int) -> int:
+    """Mark failed the running jobs whose lease expired on their last attempt."""
+    now = datetime.utcnow()
+    result = get_db().jobs.update_many(
+        {"status": "running", "lease_until": {"$lt": now}, "attempts": {"$gte": max_attempts}},
+        {"$set": {
+            "status": "failed",
+            "error": "Image generation did not finish",
+            "updated_at": now,
+            "finished_at": now
+        }}
+    )
+    return result.modified_count
+
+
+def update_job(job_id, **fields):
+    fields["updated_at"] = datetime.utcnow()
+    get_db().jobs.update_one({"_id": job_id}, {"$set": fields})
+
+
+def get_job(job_id):
+    return get_db().jobs.find_one({"_id": job_id}, {"content": 0})
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import uuid
+
+from pymongo.errors import DuplicateKeyError
+
+import dedup
+import slack_outbox
+from mongo import find_submission_by_render_hash, save_submission
+from shared import metrics
+from storage import upload_renditions
+from utils import render_pool
+from utils.render_key import choose_template, normalize_text, render_key
+
+logger = logging.getLogger("uvicorn")
+
+
+class PipelineError(Exception):
+    """A submission stage failed; detail is safe to show to the client."""
+
+    def __init__(self, stage: str, detail: str):
+        super().__init__(detail)
+        self.stage = stage
+        self.detail = detail
+
+
+async def _noop_stage(stage: str):
+    pass
+
+
+async def generate_submission(content: str, on_stage=_noop_stage) -> dict:
+    """Render, upload and save an already validated message.
+
+    Objects are named by a hash of everything that determines the image, so
+    a message that was already rendered returns the existing submission
+    without rendering or uploading again.
+
+    on_stage is awaited with the name of each stage as it starts. Raises
+    render_pool.RenderQueueFull when the render backlog is full and
+    PipelineError when any stage fails.
+    """
+    # Content-addressed lookup
+    try:
+        text = normalize_text(content)
+        template = choose_template(text)
+        render_hash = render_key(text, template)
+        existing = await dedup.lookup(render_hash)
+    except Exception as e:
+        logger.error(f"Render lookup failed: {str(e)}")
+        raise PipelineError("rendering", "Image generation failed")
+    key_prefix = render_hash
+    if existing is dedup.HIDDEN:
+        # Never hand out a hidden post; render a copy under its own keys, which moderating
+        # the hidden one cannot touch, and leave the hash with the hidden post
+        key_prefix = f"{render_hash}-{uuid.uuid4().hex[:8]}"
+        render_hash = None
+    elif existing is not None:
+        logger.info(f"Reusing render {render_hash} of submission {existing['submission_id']}")
+        return existing
+
+    # Image generation; the render pool records the render and encode stages
+    await on_stage("rendering")
+    try:
+        renditions = await render_pool.render(text, template)
+    except render_pool.RenderQueueFull:
+        raise
+    except Exception as e:
+        logger.error(f"Image generation failed: {str(e)}")
+        raise PipelineError("rendering", "Image generation failed")
+    for name, rendition in renditions.items():
+        metrics.OUTPUT_BYTES.labels(name).observe(len(rendition["data"]))
+
+    # Upload to MinIO
+    await on_stage("uploading")
+    try:
+        with metrics.time_stage("upload"):
+            await upload_renditions(renditions, key_prefix=key_prefix)
+    except Exception as e:
+        logger.error(f"MinIO upload failed: {str(e)}")
+        raise PipelineError("uploading", "Image upload failed")
+
+    # Save to Mongo, with the Slack notification in the same insert
+    await on_stage("saving")
+    notification = content if slack_outbox.enabled() else None
+    try:
+        with metrics.time_stage("db_save"):
+            submission_id = await asyncio.to_thread(save_submission, renditions, render_hash, notification)
+    except DuplicateKeyError:
+        # An identical submission finished first; its objects are the ones just overwritten
+        doc = await asyncio.to_thread(find_submission_by_render_hash, render_hash)
+        if doc is None or doc.get("hidden"):
+            raise PipelineError("saving", "Submission save failed")
+        result = dedup.submission_result(doc)
+        dedup.remember(render_hash, result)
+        return result
+    except Exception as e:
+        logger.error(f"MongoDB save failed: {str(e)}")
+        raise PipelineError("saving", "Submission save failed")
+
+    result = {
+        "image_url": renditions["full"]["url"],
+        "thumbnail_url": renditions["thumbnail"]["url"],
+        "renditions": {name: rendition["url"] for name, rendition in renditions.items()},
+        "submission_id": str(submission_id)
+    }
+    if render_hash is not None:
+        dedup.remember(render_hash, result)
+    return result
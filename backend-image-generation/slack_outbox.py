@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+
+import requests
+from pymongo import ASCENDING
+
+import mongo
+from shared.indexes import UNDELIVERED
+
+logger = logging.getLogger("uvicorn")
+
+SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK")
+ENVIRONMENT = os.getenv("ENVIRONMENT", "")
+# Notifications arriving within one interval are sent as a single digest message
+SLACK_DIGEST_INTERVAL = float(os.getenv("SLACK_DIGEST_INTERVAL", "30"))
+SLACK_MAX_BATCH = int(os.getenv("SLACK_MAX_BATCH", "50"))
+SLACK_TIMEOUT = float(os.getenv("SLACK_TIMEOUT", "5"))
+SLACK_MAX_ATTEMPTS = int(os.getenv("SLACK_MAX_ATTEMPTS", "10"))
+SLACK_MAX_BACKOFF = float(os.getenv("SLACK_MAX_BACKOFF", "900"))
+# A claimed batch that is not acknowledged within this time is picked up again
+SLACK_LEASE_SECONDS = float(os.getenv("SLACK_LEASE_SECONDS", "120"))
+
+_task = None
+
+
+def enabled() -> bool:
+    return bool(SLACK_WEBHOOK_URL) and ENVIRONMENT != "local"
+
+
+def _claim_batch(token: str) -> list:
+    """Atomically lease up to SLACK_MAX_BATCH due notifications for this dispatcher.
+
+    Notifications are the "notification" subdocuments that save_submission
+    writes with each submission; a delivered one is removed.
+    """
+    now = datetime.utcnow()
+    due = {**UNDELIVERED, "notification.next_attempt_at": {"$lte": now}}
+    ids = [doc["_id"] for doc in mongo.submissions_collection.find(due, {"_id": 1})
+           .sort("notification.next_attempt_at", ASCENDING).limit(SLACK_MAX_BATCH)]
+    if not ids:
+        return []
+
+    # Only documents still due are claimed, so concurrent dispatchers never share a batch
+    mongo.submissions_collection.update_many(
+        {"_id": {"$in": ids}, **due},
+        {"$set": {
+            "notification.status": "sending",
+            "notification.claimed_by": token,
+            "notification.next_attempt_at": now + timedelta(seconds=SLACK_LEASE_SECONDS)
+        }}
+    )
+    docs = mongo.submissions_collection.find({"notification.claimed_by": token}, {"notification": 1})
+    return [doc["notification"] for doc in docs.sort("_id", ASCENDING)]
+
+
+def _digest_text(batch: list) -> str:
+    if len(batch) == 1:
+        return ":new: :tada: New submit: \n" + batch[0]["text"]
+    entries = "\n\n".join(f"{i}. {notification['text']}" for i, notification in enumerate(batch, start=1))
+    return f":new: :tada: {len(batch)} new submits: \n" + entries
+
+
+def _release_failed(token: str, batch: list, error: str):
+    attempts = max(notification.get("attempts", 0) for notification in batch) + 1
+    delay = min(SLACK_DIGEST_INTERVAL * 2 ** attempts, SLACK_MAX_BACKOFF)
+    delay *= random.uniform(0.8, 1.2)  # jitter so workers don't retry in lockstep
+    status = "failed" if attempts >= SLACK_MAX_ATTEMPTS else "pending"
+
+    mongo.submissions_collection.update_many(
+        {"notification.claimed_by": token},
+        {
+            "$set": {
+                "notification.status": status,
+                "notification.attempts": attempts,
+                "notification.last_error": error,
+                "notification.next_attempt_at": datetime.utcnow() + timedelta(seconds=delay)
+            },
+            "$unset": {"notification.claimed_by": ""}
+        }
+    )
+    logger.error(f"Slack digest of {len(batch)} notification(s) failed (attempt {attempts}): {error}")
+
+
+def drain_once() -> int:
+    """Send every due notification as digests of up to SLACK_MAX_BATCH. Returns the number delivered."""
+    delivered = 0
+    while True:
+        token = uuid.uuid4().hex
+        batch = _claim_batch(token)
+        if not batch:
+            return delivered
+
+        try:
+            response = requests.post(SLACK_WEBHOOK_URL, json={"text": _digest_text(batch)}, timeout=SLACK_TIMEOUT)
+            if response.status_code != 200:
+                _release_failed(token, batch, f"HTTP {response.status_code}: {response.text}")
+                return delivered
+        except requests.exceptions.RequestException as e:
+            _release_failed(token, batch, str(e))
+            return delivered
+
+        mongo.submissions_collection.update_many({"notification.claimed_by": token}, {"$unset": {"notification": ""}})
+        delivered += len(batch)
+
+
+async def _run():
+    while True:
+        await asyncio.sleep(SLACK_DIGEST_INTERVAL)
+        try:
+            delivered = await asyncio.to_thread(drain_once)
+            if delivered:
+                logger.info(f"Delivered {delivered} Slack notification(s)")
+        except Exception as e:
+            logger.error(f"Slack outbox dispatcher error: {str(e)}")
+
+
+def start():
+    global _task
+    if not enabled():
+        logger.warning("Slack notifications disabled (no webhook configured or local environment)")
+        return
+    _task = asyncio.create_task(_run())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -0,0 +1,101 @@
+import asyncio
+import os
+from io import BytesIO
+
+import certifi
+import urllib3
+from minio import Minio
+
+from shared import metrics
+
+# Environment variables
+MINIO_URL = os.getenv("MINIO_URL", "minio:9000")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "muki")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "kenomuki")
+MINIO_BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "thumbnails")
+ENVIRONMENT = os.getenv("ENVIRONMENT", "")
+
+# Connection pool shared by all uploads; sized for parallel rendition uploads from every job worker
+MINIO_POOL_SIZE = int(os.getenv("MINIO_POOL_SIZE", "32"))
+MINIO_CONNECT_TIMEOUT = float(os.getenv("MINIO_CONNECT_TIMEOUT", "3"))
+MINIO_READ_TIMEOUT = float(os.getenv("MINIO_READ_TIMEOUT", "30"))
+# Objects larger than this are sent as multipart uploads with parallel parts
+MINIO_MULTIPART_THRESHOLD = int(os.getenv("MINIO_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+MINIO_PART_SIZE = int(os.getenv("MINIO_PART_SIZE", str(5 * 1024 * 1024)))  # S3 minimum part size
+MINIO_PARALLEL_PARTS = int(os.getenv("MINIO_PARALLEL_PARTS", "4"))
+
+# Object names are content-addressed: a name is only ever written again with identical
+# bytes, so clients and CDNs may cache them forever
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+http_client = urllib3.PoolManager(
+    num_pools=4,
+    maxsize=MINIO_POOL_SIZE,
+    timeout=urllib3.Timeout(connect=MINIO_CONNECT_TIMEOUT, read=MINIO_READ_TIMEOUT),
+    retries=urllib3.Retry(total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+    cert_reqs="CERT_REQUIRED",
+    ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+)
+
+# Minio client
+minio_client = Minio(
+    MINIO_URL,
+    access_key=MINIO_ACCESS_KEY,
+    secret_key=MINIO_SECRET_KEY,
+    secure=(ENVIRONMENT != "local"),
+    http_client=http_client,
+)
+
+
+def object_url(bucket_name: str, filename: str) -> str:
+    # Adjust the Minio URL based on the environment when returning the image URL
+    if ENVIRONMENT == "local":
+        return f"http://localhost:9000/{bucket_name}/{filename}"  # Local Minio URL
+    else:
+        return f"https://minio.thewordsleftbehind.com/{bucket_name}/{filename}"  # Return HTTPS URL in production
+
+
+def upload_image_to_minio(image_io: BytesIO, filename: str, bucket_name: str, content_type: str) -> str:
+    # Size the buffer without copying it
+    length = image_io.getbuffer().nbytes
+    image_io.seek(0)
+
+    options = {}
+    if length > MINIO_MULTIPART_THRESHOLD:
+        options = {"part_size": MINIO_PART_SIZE, "num_parallel_uploads": MINIO_PARALLEL_PARTS}
+
+    # Upload the image to Minio
+    with metrics.time_storage("put_object"):
+        minio_client.put_object(
+            bucket_name,
+            filename,
+            image_io,
+            length,
+            content_type,
+            metadata={"Cache-Control": CACHE_CONTROL},
+            **options
+        )
+
+    return object_url(bucket_name, filename)
+
+
+async def upload_renditions(renditions: dict, key_prefix: str, bucket_name: str = MINIO_BUCKET_NAME) -> dict:
+    """Upload all renditions of one submission in parallel.
+
+    Sets "url" and "key" on every rendition and returns the same dict.
+    """
+    names = list(renditions)
+    keys = [f"{key_prefix}-{name}.{renditions[name]['extension']}" for name in names]
+
+    urls = await asyncio.gather(*(
+        asyncio.to_thread(
+            upload_image_to_minio, BytesIO(renditions[name]["data"]), key, bucket_name,
+            renditions[name]["content_type"]
+        )
+        for name, key in zip(names, keys)
+    ))
+
+    for name, key, url in zip(names, keys, urls):
+        renditions[name]["key"] = key
+        renditions[name]["url"] = url
+    return renditions
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Service modules are imported by bare name, and shared from the repository root
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [SERVICE_DIR, os.path.dirname(SERVICE_DIR)]
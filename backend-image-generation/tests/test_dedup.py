@@ -0,0 +1,42 @@
+import asyncio
+
+import mongomock
+import pytest
+
+import dedup
+import mongo
+from utils import render_key
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock.MongoClient().images
+    monkeypatch.setattr(mongo, "get_db", lambda: database)
+    dedup._entries.clear()
+    return database
+
+
+def _submission(render_hash: str, **fields) -> dict:
+    return {"render_hash": render_hash, "image_url": "full.webp", "thumbnail_url": "thumb.webp", "renditions": {}, **fields}
+
+
+def test_visible_submission_is_reused(db):
+    submission_id = db.submissions.insert_one(_submission("a" * 32)).inserted_id
+    result = asyncio.run(dedup.lookup("a" * 32))
+    assert result["submission_id"] == str(submission_id)
+
+
+def test_hidden_submission_is_never_returned(db):
+    db.submissions.insert_one(_submission("b" * 32, hidden=True))
+    assert asyncio.run(dedup.lookup("b" * 32)) is dedup.HIDDEN
+    assert "b" * 32 not in dedup._entries
+
+
+def test_templates_are_chosen_from_the_refreshed_list(monkeypatch):
+    names = ["a.png", "b.png"]
+    monkeypatch.setattr(render_key, "template_names", lambda: sorted(names))
+    assert {render_key.choose_template(str(i)) for i in range(50)} == {"a.png", "b.png"}
+
+    # Added and removed templates are seen without a restart
+    names[:] = ["b.png", "c.png"]
+    assert {render_key.choose_template(str(i)) for i in range(50)} == {"b.png", "c.png"}
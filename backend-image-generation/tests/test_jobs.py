@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+
+import mongo
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock.MongoClient().images
+    monkeypatch.setattr(mongo, "get_db", lambda: database)
+    return database
+
+
+def _expire_lease(db, job_id):
+    db.jobs.update_one({"_id": job_id}, {"$set": {"lease_until": datetime.utcnow() - timedelta(seconds=1)}})
+
+
+def test_expired_lease_is_reclaimed_until_attempts_run_out(db):
+    job_id = mongo.create_job("hello")
+
+    for attempt in (1, 2, 3):
+        job = mongo.claim_job("worker", 60, 3)
+        assert job["_id"] == job_id and job["attempts"] == attempt
+        _expire_lease(db, job_id)
+
+    # A poison job is not claimed a fourth time; the reaper fails it
+    assert mongo.claim_job("worker", 60, 3) is None
+    assert mongo.fail_abandoned_jobs(3) == 1
+    job = db.jobs.find_one({"_id": job_id})
+    assert job["status"] == "failed"
+    assert "finished_at" in job
+
+
+def test_live_lease_is_not_reclaimed(db):
+    mongo.create_job("hello")
+    assert mongo.claim_job("worker", 60, 3) is not None
+    assert mongo.claim_job("other", 60, 3) is None
+    assert mongo.fail_abandoned_jobs(1) == 0
+
+
+def test_released_job_does_not_spend_an_attempt(db):
+    job_id = mongo.create_job("hello")
+    for _ in range(5):
+        mongo.claim_job("worker", 60, 3)
+        mongo.release_job(job_id)
+
+    job = db.jobs.find_one({"_id": job_id})
+    assert job["status"] == "queued"
+    assert job["attempts"] == 0
+    assert "lease_until" not in job
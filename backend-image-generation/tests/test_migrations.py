@@ -0,0 +1,66 @@
+import mongomock
+import pytest
+
+from migrations import runner
+
+
+class RecordSeen(runner.Migration):
+    """Writes nothing, so every batch only advances the checkpoints; remembers what it was given."""
+    name = "test_record_seen"
+    projection = {"_id": 1}
+
+    def __init__(self):
+        self.seen = []
+
+    def operations(self, docs: list) -> list:
+        self.seen.extend(doc["_id"] for doc in docs)
+        return []
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock.MongoClient().images
+    monkeypatch.setattr(runner, "get_db", lambda: database)
+    database.submissions.insert_many([{"n": i} for i in range(25)])
+    return database
+
+
+def _checkpoints(db) -> int:
+    return db.migrations.count_documents({"migration": RecordSeen.name})
+
+
+def test_runs_to_completion(db):
+    migration = RecordSeen()
+    assert runner.run(migration, workers=3, batch_size=4)["processed"] == 25
+    assert sorted(migration.seen) == sorted(doc["_id"] for doc in db.submissions.find())
+    assert runner.is_complete(migration)
+
+
+def test_resumes_after_a_crash_between_state_and_checkpoints(db, monkeypatch):
+    # The state document is stored, then the run dies before writing any checkpoint
+    update_one = db.migrations.update_one
+
+    def crash_on_checkpoint(query, *args, **kwargs):
+        if query["_id"] != RecordSeen.name:
+            raise KeyboardInterrupt
+        return update_one(query, *args, **kwargs)
+
+    monkeypatch.setattr(db.migrations, "update_one", crash_on_checkpoint)
+    with pytest.raises(KeyboardInterrupt):
+        runner.run(RecordSeen(), workers=3, batch_size=4)
+    monkeypatch.undo()
+    monkeypatch.setattr(runner, "get_db", lambda: db)
+    assert _checkpoints(db) == 0
+
+    migration = RecordSeen()
+    runner.run(migration, workers=1, batch_size=4)
+    assert len(set(migration.seen)) == 25
+    # The ranges stored by the interrupted run are kept
+    assert _checkpoints(db) == 3
+
+
+def test_rerun_of_a_prepared_migration_does_not_fail(db):
+    checkpoint_ids = runner._prepare(RecordSeen(), 3, restart=False)
+    db.migrations.delete_one({"_id": checkpoint_ids[-1]})
+    assert runner._prepare(RecordSeen(), 3, restart=False) == checkpoint_ids
+    assert _checkpoints(db) == 3
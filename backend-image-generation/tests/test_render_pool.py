@@ -0,0 +1,53 @@
+import asyncio
+import os
+import signal
+
+import pytest
+
+from utils import render_pool
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Templates and the font are found relative to the service directory
+    monkeypatch.chdir(SERVICE_DIR)
+    monkeypatch.setattr(render_pool, "RENDER_WORKERS", 1)
+    monkeypatch.setattr(render_pool, "_rebuild_task", None)
+    yield render_pool
+    render_pool.shutdown()
+
+
+def test_render_recovers_after_a_worker_dies(pool):
+    async def scenario():
+        await pool.start()
+        loop = asyncio.get_running_loop()
+        pid = await loop.run_in_executor(pool._executor, pool._warm)
+        os.kill(pid, signal.SIGKILL)
+        # Wait for the executor to notice the dead worker
+        while pool.healthy() or pool._rebuild_task is None:
+            await asyncio.sleep(0.05)
+        await pool._rebuild_task
+
+        renditions = await pool.render("hello from a new pool")
+        assert renditions
+        assert pool.healthy()
+        assert await loop.run_in_executor(pool._executor, pool._warm) != pid
+
+    asyncio.run(scenario())
+
+
+def test_render_rebuilds_a_broken_pool_itself(pool):
+    async def scenario():
+        await pool.start()
+        loop = asyncio.get_running_loop()
+        os.kill(await loop.run_in_executor(pool._executor, pool._warm), signal.SIGKILL)
+        while not pool._broken(pool._executor):
+            await asyncio.sleep(0.05)
+
+        # No readiness probe in between: the render itself rebuilds and retries
+        assert await pool.render("hello again")
+        assert pool.healthy()
+
+    asyncio.run(scenario())
@@ -0,0 +1,129 @@
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import mongomock
+import pytest
+
+import mongo
+import slack_outbox
+
+
+class WebhookStub:
+    """Local HTTP server standing in for the Slack webhook."""
+
+    def __init__(self):
+        self.messages = []
+        self.status = 200
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                stub.messages.append(json.loads(body)["text"])
+                self.send_response(stub.status)
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/webhook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock.MongoClient().images
+    monkeypatch.setattr(mongo, "get_db", lambda: database)
+    return database
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    stub = WebhookStub()
+    monkeypatch.setattr(slack_outbox, "SLACK_WEBHOOK_URL", stub.url)
+    yield stub
+    stub.close()
+
+
+def _renditions() -> dict:
+    return {
+        name: {
+            "url": f"http://minio/thumbnails/{name}.webp",
+            "key": f"{name}.webp",
+            "data": b"image",
+            "content_type": "image/webp",
+            "width": 400,
+            "height": 400,
+        }
+        for name in ("thumbnail", "full")
+    }
+
+
+def test_notification_is_saved_with_the_submission(db):
+    submission_id = mongo.save_submission(_renditions(), notification="hello")
+
+    notification = db.submissions.find_one({"_id": submission_id})["notification"]
+    assert notification["text"] == "hello"
+    assert notification["status"] == "pending"
+    assert notification["attempts"] == 0
+
+
+def test_due_notifications_are_sent_as_one_digest(db, webhook):
+    for text in ("first", "second", "third"):
+        mongo.save_submission(_renditions(), notification=text)
+
+    assert slack_outbox.drain_once() == 3
+    assert len(webhook.messages) == 1
+    assert "3 new submits" in webhook.messages[0]
+    assert "1. first" in webhook.messages[0] and "3. third" in webhook.messages[0]
+    assert db.submissions.count_documents({"notification": {"$exists": True}}) == 0
+    assert db.submissions.count_documents({}) == 3
+
+
+def test_failed_delivery_is_retried_later(db, webhook):
+    webhook.status = 500
+    submission_id = mongo.save_submission(_renditions(), notification="hello")
+
+    assert slack_outbox.drain_once() == 0
+    notification = db.submissions.find_one({"_id": submission_id})["notification"]
+    assert notification["status"] == "pending"
+    assert notification["attempts"] == 1
+    assert notification["next_attempt_at"] > datetime.utcnow()
+    assert "claimed_by" not in notification
+
+    # Not due again until its backoff has passed
+    webhook.status = 200
+    assert slack_outbox.drain_once() == 0
+    db.submissions.update_one({"_id": submission_id}, {"$set": {"notification.next_attempt_at": datetime.utcnow()}})
+    assert slack_outbox.drain_once() == 1
+    assert len(webhook.messages) == 2
+
+
+def test_notification_fails_after_max_attempts(db, webhook, monkeypatch):
+    monkeypatch.setattr(slack_outbox, "SLACK_MAX_ATTEMPTS", 1)
+    webhook.status = 500
+    submission_id = mongo.save_submission(_renditions(), notification="hello")
+
+    slack_outbox.drain_once()
+    assert db.submissions.find_one({"_id": submission_id})["notification"]["status"] == "failed"
+
+
+def test_expired_lease_is_claimed_again(db, webhook):
+    submission_id = mongo.save_submission(_renditions(), notification="hello")
+    # A dispatcher claimed it and died before acknowledging
+    db.submissions.update_one({"_id": submission_id}, {"$set": {
+        "notification.status": "sending",
+        "notification.claimed_by": "gone",
+        "notification.next_attempt_at": datetime.utcnow() - timedelta(seconds=1)
+    }})
+
+    assert slack_outbox.drain_once() == 1
+    assert webhook.messages == [":new: :tada: New submit: \nhello"]
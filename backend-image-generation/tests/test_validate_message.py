@@ -0,0 +1,64 @@
+import random
+
+import pytest
+from better_profanity import profanity
+
+from utils.validate_message import contains_profanity
+
+# Letter-spaced and split words, alone and inside sentences: better_profanity joins a word with
+# up to MAX_NUMBER_COMBINATIONS following words, but never a one-character word ending the text
+CASES = [
+    "s.h.i.t", "this is s.h.i.t ok", "that was s.h.i.t",
+    "f u c k", "you f u c k off", "oh f u c k",
+    "as s", "he is as s well", "kick as s",
+    "wh or e", "a wh or e here", "a wh or e",
+    "f-u-c-k", "so f-u-c-k", "so f-u-c-k off",
+    "m o t h e r f u c k e r", "m o t h e r f u c k e r is long",
+    "bull shit", "you bull shit man", "hand job", "a hand job x", "hand  job", "hand-job",
+    "shit", "a shit", "sh1t", "$h!t", "5h17 happens", "the as", "ass", "class", "assessment",
+    "a", " a", "ab", "", "   ", "...", "hello world", "the words we leave behind",
+    "Stay soft in a world that asks you to harden.", "wh, or, e", "HOR, E", "p, ri, c, k",
+]
+
+_WORDS = "the words we leave behind are quiet letters to a future as is or he wh so you hand job bull".split()
+_LEET = {"a": "@4*", "i": "1l*", "o": "0@*", "e": "3*", "s": "$5", "t": "7", "u": "v*", "l": "1"}
+_SEPARATORS = [" ", ".", "-", "  ", ", ", "_", "!", " - "]
+
+
+def _generated(count: int, seed: int = 16) -> list:
+    """Messages mixing clean words with wordlist entries, leetspeak and entries split by separators."""
+    rng = random.Random(seed)
+    wordlist = sorted(str(word) for word in profanity.CENSOR_WORDSET)
+
+    def fragment():
+        if rng.random() >= 0.3:
+            return rng.choice(_WORDS)
+        word = "".join(rng.choice(_LEET[c]) if c in _LEET and rng.random() < 0.3 else c for c in rng.choice(wordlist))
+        if len(word) > 1 and rng.random() < 0.5:
+            cuts = sorted(rng.sample(range(1, len(word)), min(len(word) - 1, rng.randint(1, 3))))
+            parts = [word[start:end] for start, end in zip([0] + cuts, cuts + [len(word)])]
+            word = rng.choice(_SEPARATORS).join(parts)
+        return word
+
+    messages = []
+    for _ in range(count):
+        message = "".join(fragment() + rng.choice(_SEPARATORS) for _ in range(rng.randint(1, 8)))
+        if rng.random() < 0.5:
+            message = message.rstrip(" .-_,!")
+        if rng.random() < 0.2:
+            message = message.upper()
+        messages.append(message)
+    return messages
+
+
+@pytest.mark.parametrize("message", CASES)
+def test_matches_better_profanity_on_split_words(message):
+    assert contains_profanity(message) == profanity.contains_profanity(message)
+
+
+def test_matches_better_profanity_on_generated_messages():
+    mismatches = [
+        message for message in _generated(500)
+        if contains_profanity(message) != profanity.contains_profanity(message)
+    ]
+    assert mismatches == []
@@ -0,0 +1,98 @@
+import logging
+import os
+from io import BytesIO
+
+from PIL import Image, features
+
+logger = logging.getLogger("uvicorn")
+
+# Named encoder settings, trading encode CPU for output size
+ENCODER_PRESETS = {
+    "webp-fast": {
+        "format": "WEBP",
+        "content_type": "image/webp",
+        "extension": "webp",
+        "options": {"quality": 75, "method": 2},
+    },
+    "webp-balanced": {
+        "format": "WEBP",
+        "content_type": "image/webp",
+        "extension": "webp",
+        "options": {"quality": 85, "method": 4},
+    },
+    "webp-max": {
+        "format": "WEBP",
+        "content_type": "image/webp",
+        "extension": "webp",
+        "options": {"quality": 100, "method": 6},
+    },
+    "jpeg": {
+        "format": "JPEG",
+        "content_type": "image/jpeg",
+        "extension": "jpg",
+        "options": {"quality": 85, "optimize": True, "progressive": True},
+    },
+    "avif": {
+        "format": "AVIF",
+        "content_type": "image/avif",
+        "extension": "avif",
+        "options": {"quality": 60, "speed": 8},
+    },
+}
+
+# Outputs the pipeline can produce from one render; width None keeps the canvas size
+RENDITIONS = {
+    "thumbnail": {"preset": os.getenv("THUMBNAIL_PRESET", "webp-fast"), "width": int(os.getenv("THUMBNAIL_WIDTH", "512"))},
+    "full": {"preset": os.getenv("FULL_PRESET", "webp-balanced"), "width": None},
+    "jpeg": {"preset": "jpeg", "width": None},
+    "avif": {"preset": "avif", "width": None},
+}
+
+# "thumbnail" and "full" are always produced; fallbacks are opt-in, e.g. RENDITIONS=jpeg,avif
+ENABLED_RENDITIONS = ["thumbnail", "full"] + [
+    name.strip() for name in os.getenv("RENDITIONS", "").split(",")
+    if name.strip() in RENDITIONS and name.strip() not in ("thumbnail", "full")
+]
+
+
+def _supported(preset: dict) -> bool:
+    if preset["format"] == "AVIF":
+        return bool(features.check("avif"))
+    return True
+
+
+def encode(image: Image.Image, preset_name: str) -> bytes:
+    preset = ENCODER_PRESETS[preset_name]
+    img_io = BytesIO()
+    image.save(img_io, format=preset["format"], **preset["options"])
+    return img_io.getvalue()
+
+
+def encode_renditions(image: Image.Image, names=None) -> dict:
+    """Encode every requested rendition of a rendered image.
+
+    Returns name -> {"data", "content_type", "extension", "width", "height", "preset"}.
+    Renditions whose format this Pillow build cannot write are skipped.
+    """
+    renditions = {}
+    for name in names or ENABLED_RENDITIONS:
+        spec = RENDITIONS[name]
+        preset = ENCODER_PRESETS[spec["preset"]]
+        if not _supported(preset):
+            logger.warning(f"Skipping '{name}' rendition: {preset['format']} is not supported by this Pillow build")
+            continue
+
+        resized = image
+        if spec["width"] and image.width > spec["width"]:
+            height = round(image.height * spec["width"] / image.width)
+            resized = image.resize((spec["width"], height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+        renditions[name] = {
+            "data": encode(resized, spec["preset"]),
+            "content_type": preset["content_type"],
+            "extension": preset["extension"],
+            "width": resized.width,
+            "height": resized.height,
+            "preset": spec["preset"],
+        }
+    return renditions
@@ -0,0 +1,134 @@
+import os
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
+
+from PIL import ImageFont
+
+FONT_PATH = os.getenv("FONT_PATH", "ReenieBeanie-Regular.ttf")
+
+# Sizes the auto-sizer may pick from; each one is loaded and measured once per process
+FONT_SIZES = tuple(range(int(os.getenv("MIN_FONT_SIZE", "32")), int(os.getenv("MAX_FONT_SIZE", "84")) + 1, 4))
+LINE_SPACING = 1.2  # multiple of the cap height
+
+
+@lru_cache(maxsize=None)
+def get_font(size: int) -> ImageFont.FreeTypeFont:
+    try:
+        return ImageFont.truetype(FONT_PATH, size=size)
+    except IOError:
+        return ImageFont.load_default(size=size)
+
+
+@lru_cache(maxsize=None)
+def _advances(size: int) -> dict:
+    # Filled lazily by char_width; one dict per font size
+    return {}
+
+
+def char_width(char: str, size: int) -> float:
+    advances = _advances(size)
+    width = advances.get(char)
+    if width is None:
+        width = advances[char] = get_font(size).getlength(char)
+    return width
+
+
+def text_width(text: str, size: int) -> float:
+    return sum(char_width(char, size) for char in text)
+
+
+@lru_cache(maxsize=None)
+def line_spacing(size: int) -> int:
+    bbox = get_font(size).getbbox("A")
+    return int((bbox[3] - bbox[1]) * LINE_SPACING)
+
+
+def _split_word(word: str, size: int, max_width: float) -> list:
+    """Break a word wider than max_width into pieces using prefix widths."""
+    prefix = list(accumulate(char_width(char, size) for char in word))
+    pieces = []
+    start = 0
+    offset = 0.0
+    while start < len(word):
+        # Index of the first character that would overflow the line
+        end = bisect_right(prefix, offset + max_width, lo=start)
+        end = max(end, start + 1)  # always make progress, even for one huge glyph
+        pieces.append(word[start:end])
+        offset = prefix[end - 1]
+        start = end
+    return pieces
+
+
+def wrap_paragraph(paragraph: str, size: int, max_width: float) -> list:
+    """Greedy word wrap in pixel space, single pass over the paragraph."""
+    space = char_width(" ", size)
+    lines = []
+    current = []
+    current_width = 0.0
+
+    for word in paragraph.split():
+        word_width = text_width(word, size)
+        if word_width > max_width:
+            pieces = _split_word(word, size, max_width)
+        else:
+            pieces = [word]
+
+        for piece in pieces:
+            piece_width = word_width if len(pieces) == 1 else text_width(piece, size)
+            if current and current_width + space + piece_width <= max_width:
+                current.append(piece)
+                current_width += space + piece_width
+            else:
+                if current:
+                    lines.append(" ".join(current))
+                current = [piece]
+                current_width = piece_width
+
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+
+def split_paragraphs(text: str) -> list:
+    # Split manually where a literal \n is present
+    return [paragraph for paragraph in text.split('\\n') if paragraph.strip()]
+
+
+def wrap_text(text: str, size: int, max_width: float) -> list:
+    lines = []
+    for paragraph in split_paragraphs(text):
+        lines.extend(wrap_paragraph(paragraph, size, max_width))
+    return lines
+
+
+def fit_text(text: str, max_width: float, max_height: float) -> tuple:
+    """Pick the largest font size whose wrapped text fits the box.
+
+    Returns (size, lines). Binary search over FONT_SIZES; falls back to the
+    smallest size if nothing fits.
+    """
+    low, high = 0, len(FONT_SIZES) - 1
+    best = None
+    while low <= high:
+        middle = (low + high) // 2
+        size = FONT_SIZES[middle]
+        lines = wrap_text(text, size, max_width)
+        if line_spacing(size) * len(lines) <= max_height:
+            best = (size, lines)
+            low = middle + 1
+        else:
+            high = middle - 1
+
+    if best is None:
+        size = FONT_SIZES[0]
+        best = (size, wrap_text(text, size, max_width))
+    return best
+
+
+def preload_fonts():
+    """Load every auto-size font and measure printable ASCII up front."""
+    for size in FONT_SIZES:
+        line_spacing(size)
+        for code in range(32, 127):
+            char_width(chr(code), size)
@@ -0,0 +1,64 @@
+import random
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+from utils.encoding import encode_renditions
+from utils.layout import fit_text, get_font, line_spacing, text_width
+from utils.render_key import choose_template
+from utils.templates import get_template, template_names, TEMPLATE_DIR, WATERMARK_MARGIN_BOTTOM
+
+TEXT_MARGIN = 90  # horizontal/top padding around the text block, in pixels
+
+
+def render_quote(text: str, template: str = None) -> Image.Image:
+    """Draw text on the named template, or on a random one if none is given."""
+    color_folder = "white"
+    if template is None:
+        names = template_names()
+        if not names:
+            raise FileNotFoundError(f"No images found in '{TEMPLATE_DIR}'.")
+        template = random.choice(names)
+
+    # Darkened background with the watermark already applied
+    try:
+        image = get_template(template)
+    except FileNotFoundError:
+        # Removed since it was chosen; pick again from the templates there now
+        image = get_template(choose_template(text))
+
+    draw = ImageDraw.Draw(image)
+
+    # Largest font size whose wrapped text fits above the watermark
+    box_width = image.width - 2 * TEXT_MARGIN
+    box_height = image.height - TEXT_MARGIN - 2 * WATERMARK_MARGIN_BOTTOM
+    font_size, lines = fit_text(text, box_width, box_height)
+    font = get_font(font_size)
+
+    # Centered vertical layout
+    spacing = line_spacing(font_size)
+    total_height = spacing * len(lines)
+
+    y_text = (image.height - total_height) // 2
+
+    text_color = "white" if color_folder == "white" else "black"
+
+    for line in lines:
+        line_width = text_width(line, font_size)
+        x_text = (image.width - line_width) // 2
+        draw.text((x_text, y_text), line, font=font, fill=text_color)
+        y_text += spacing
+
+    return image
+
+
+def render_renditions(text: str, template: str = None) -> dict:
+    """Render text once and encode all enabled renditions (see utils.encoding)."""
+    return encode_renditions(render_quote(text, template))
+
+
+def add_text_to_image_and_save_as_webp(text: str) -> BytesIO:
+    # Full-size WebP only
+    img_io = BytesIO(encode_renditions(render_quote(text), names=["full"])["full"]["data"])
+    img_io.seek(0)
+    return img_io
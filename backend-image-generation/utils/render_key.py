@@ -0,0 +1,41 @@
+import hashlib
+import json
+import os
+import unicodedata
+
+from utils.encoding import ENABLED_RENDITIONS, ENCODER_PRESETS, RENDITIONS
+from utils.layout import FONT_PATH, FONT_SIZES
+from utils.templates import template_names, TEMPLATE_DIR
+
+# Bump whenever the drawing code changes, so objects rendered by older code are not reused
+RENDER_VERSION = 1
+
+def normalize_text(text: str) -> str:
+    """Canonical form of a message; renders identically to the original.
+
+    Words are wrapped on any whitespace, so runs of whitespace collapse to
+    one space without changing the image.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def choose_template(text: str) -> str:
+    """Template picked deterministically from the normalized text, among the templates there now."""
+    names = template_names()
+    if not names:
+        raise FileNotFoundError(f"No images found in '{TEMPLATE_DIR}'.")
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return names[int.from_bytes(digest, "big") % len(names)]
+
+
+def render_key(text: str, template: str) -> str:
+    """Hash of everything that determines the rendered objects."""
+    encoders = {
+        name: {"width": RENDITIONS[name]["width"], **ENCODER_PRESETS[RENDITIONS[name]["preset"]]}
+        for name in ENABLED_RENDITIONS
+    }
+    material = json.dumps(
+        [RENDER_VERSION, text, template, os.path.basename(FONT_PATH), FONT_SIZES, encoders],
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.blake2b(material.encode("utf-8"), digest_size=16).hexdigest()
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from shared import metrics
+from utils.encoding import encode_renditions
+from utils.layout import preload_fonts
+from utils.render import render_quote
+from utils.templates import refresh_templates
+
+logger = logging.getLogger("uvicorn")
+
+# Each uvicorn worker runs its own pool, so by default the cores are split between them.
+# Every render process holds its own decoded templates and fonts, roughly 250 MB.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+# Renders allowed to be running or waiting at once before new ones are refused
+RENDER_QUEUE_SIZE = int(os.getenv("RENDER_QUEUE_SIZE", str(RENDER_WORKERS * 4)))
+RENDER_RETRY_AFTER = int(os.getenv("RENDER_RETRY_AFTER", "5"))
+
+_executor = None
+_rebuild_lock = asyncio.Lock()
+_rebuild_task = None
+_pending = 0
+_cpu_seconds = 0.0  # CPU time the workers spent on finished renders
+
+
+class RenderQueueFull(Exception):
+    """Raised when the render backlog is at RENDER_QUEUE_SIZE."""
+
+
+def _init_worker():
+    # Every worker process keeps its own warm template and font caches
+    refresh_templates(force=True)
+    preload_fonts()
+
+
+def _warm() -> int:
+    return os.getpid()
+
+
+def _render(text: str, template: str) -> tuple:
+    """Renditions plus render and encode seconds and CPU seconds, measured here since metrics live in the parent."""
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    image = render_quote(text, template)
+    rendered = time.perf_counter()
+    renditions = encode_renditions(image)
+    return renditions, rendered - started, time.perf_counter() - rendered, time.process_time() - cpu_started
+
+
+async def _spawn() -> ProcessPoolExecutor:
+    executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS, initializer=_init_worker)
+    # Spawn all workers now so the first requests don't pay for process start-up
+    loop = asyncio.get_running_loop()
+    pids = await asyncio.gather(*(loop.run_in_executor(executor, _warm) for _ in range(RENDER_WORKERS)))
+    logger.info(f"Render pool started with {len(set(pids))} worker(s), queue size {RENDER_QUEUE_SIZE}")
+    return executor
+
+
+async def start():
+    global _executor
+    _executor = await _spawn()
+
+
+def _broken(executor) -> bool:
+    # Set by the executor itself once any worker process dies
+    return executor is None or bool(getattr(executor, "_broken", False))
+
+
+async def _rebuild(broken: ProcessPoolExecutor):
+    """Replace a pool whose worker died (OOM kill, crash in PIL); concurrent callers share one rebuild."""
+    global _executor
+    async with _rebuild_lock:
+        if _executor is not broken:
+            return
+        logger.error("Render pool is broken, starting a new one")
+        metrics.RENDER_POOL_REBUILDS.inc()
+        if broken is not None:
+            broken.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _executor = await _spawn()
+
+
+def healthy() -> bool:
+    """False while the pool is broken; a rebuild is started in the background if none is running."""
+    global _rebuild_task
+    if not _broken(_executor):
+        return True
+    if _rebuild_task is None or _rebuild_task.done():
+        _rebuild_task = asyncio.create_task(_rebuild(_executor))
+    return False
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+def queue_depth() -> int:
+    return _pending
+
+
+def cpu_seconds() -> float:
+    return _cpu_seconds
+
+
+async def render(text: str, template: str = None) -> dict:
+    """Render and encode text on the process pool, returning the encoded renditions."""
+    global _pending, _cpu_seconds
+    if _pending >= RENDER_QUEUE_SIZE:
+        raise RenderQueueFull(f"Render queue is full ({_pending} pending)")
+
+    _pending += 1
+    metrics.RENDER_QUEUE_DEPTH.inc()
+    try:
+        loop = asyncio.get_running_loop()
+        executor = _executor
+        try:
+            if _broken(executor):
+                raise BrokenProcessPool("Render pool is not running")
+            result = await loop.run_in_executor(executor, _render, text, template)
+        except BrokenProcessPool:
+            # Retried once on a fresh pool; a render that kills its worker twice is not retried again
+            await _rebuild(executor)
+            result = await loop.run_in_executor(_executor, _render, text, template)
+        renditions, render_seconds, encode_seconds, cpu = result
+    finally:
+        _pending -= 1
+        metrics.RENDER_QUEUE_DEPTH.dec()
+    _cpu_seconds += cpu
+    metrics.STAGE_LATENCY.labels("render").observe(render_seconds)
+    metrics.STAGE_LATENCY.labels("encode").observe(encode_seconds)
+    return renditions
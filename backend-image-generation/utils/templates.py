@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger("uvicorn")
+
+FONT_PATH = os.getenv("FONT_PATH", "ReenieBeanie-Regular.ttf")
+TEMPLATE_DIR = os.getenv("TEMPLATE_DIR", os.path.join("images", "white"))
+# How often (seconds) the template directory is checked for added/changed files
+TEMPLATE_REFRESH_SECONDS = float(os.getenv("TEMPLATE_REFRESH_SECONDS", "30"))
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+OVERLAY_ALPHA = 0.3
+WATERMARK_TEXT = "@the_words_left_behind"
+WATERMARK_FONT_SIZE = 30
+WATERMARK_MARGIN_BOTTOM = 100
+
+_templates = {}  # filename -> (mtime, prepared RGB image)
+_lock = threading.Lock()
+_last_scan = 0.0
+
+
+def _load_watermark_font():
+    try:
+        return ImageFont.truetype(FONT_PATH, size=WATERMARK_FONT_SIZE)
+    except IOError:
+        return ImageFont.load_default()
+
+
+def _prepare_template(path: str, text_color: str) -> Image.Image:
+    """Decode a background, darken it and bake the watermark in."""
+    with Image.open(path) as source:
+        image = source.convert("RGB")
+
+    # Apply dark overlay to make text more readable
+    overlay = Image.new("RGB", image.size, (0, 0, 0))
+    image = Image.blend(image, overlay, alpha=OVERLAY_ALPHA)
+
+    watermark_color = (0, 0, 0, 230) if text_color == "black" else (255, 255, 255, 230)
+    watermark_font = _load_watermark_font()
+
+    # Create transparent layer for watermark
+    watermark_layer = Image.new("RGBA", image.size, (0, 0, 0, 0))
+    watermark_draw = ImageDraw.Draw(watermark_layer)
+
+    watermark_width = watermark_draw.textlength(WATERMARK_TEXT, font=watermark_font)
+    x_watermark = (image.width - watermark_width) // 2
+    y_watermark = image.height - WATERMARK_MARGIN_BOTTOM
+
+    watermark_draw.text((x_watermark, y_watermark), WATERMARK_TEXT, font=watermark_font, fill=watermark_color)
+
+    image = Image.alpha_composite(image.convert("RGBA"), watermark_layer)
+    return image.convert("RGB")
+
+
+def refresh_templates(force: bool = False) -> int:
+    """Load new or modified backgrounds and drop deleted ones.
+
+    Returns the number of templates held after the refresh.
+    """
+    global _last_scan
+
+    now = time.monotonic()
+    if not force and now - _last_scan < TEMPLATE_REFRESH_SECONDS:
+        return len(_templates)
+
+    with _lock:
+        if not force and now - _last_scan < TEMPLATE_REFRESH_SECONDS:
+            return len(_templates)
+
+        found = {}
+        for entry in os.scandir(TEMPLATE_DIR):
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                found[entry.name] = entry.stat().st_mtime
+
+        for name in list(_templates):
+            if name not in found:
+                del _templates[name]
+
+        loaded = 0
+        for name, mtime in found.items():
+            cached = _templates.get(name)
+            if cached is not None and cached[0] == mtime:
+                continue
+            try:
+                image = _prepare_template(os.path.join(TEMPLATE_DIR, name), text_color="white")
+            except OSError as e:
+                logger.error(f"Failed to load template '{name}': {str(e)}")
+                continue
+            _templates[name] = (mtime, image)
+            loaded += 1
+
+        if loaded:
+            logger.info(f"Loaded {loaded} template(s), {len(_templates)} cached")
+        _last_scan = now
+        return len(_templates)
+
+
+def template_names() -> list:
+    refresh_templates()
+    return sorted(_templates)
+
+
+def get_template(name: str) -> Image.Image:
+    """Return a fresh, drawable copy of the named template."""
+    refresh_templates()
+    cached = _templates.get(name)
+    if cached is None:
+        # May have been added since the last periodic scan
+        refresh_templates(force=True)
+        cached = _templates.get(name)
+    if cached is None:
+        raise FileNotFoundError(f"Template '{name}' not found in '{TEMPLATE_DIR}'.")
+    return cached[1].copy()
@@ -1,28 +1,170 @@
 import re
 
 from better_profanity import profanity
+from better_profanity.constants import ALLOWED_CHARACTERS
 
+MAX_MESSAGE_LENGTH = 500
 
-def is_message_valid(message: str) -> bool:
+URL_REGEX = re.compile(r"(https?://[^\s]+|www\.[^\s]+|[a-zA-Z0-9\-]+\.(com|org|net|io|gov|edu|co|ai)[^\s]*)")
+REPEATING_CHAR_REGEX = re.compile(r"(.)\1{10,}")
+
+# Rule name -> message shown to the submitter, in the order the rules are checked
+RULES = {
+    "empty": "Message cannot be empty.",
+    "too_long": f"Message must be {MAX_MESSAGE_LENGTH} characters or less.",
+    "repeated_characters": "Message contains too many repeated characters.",
+    "url": "Message must not contain URL.",
+    "profanity": "Message contains bad words.",
+}
+
+
+class MessageRejected(ValueError):
+    def __init__(self, rule: str):
+        super().__init__(RULES[rule])
+        self.rule = rule
+
+
+class _ProfanityMatcher:
+    """The better_profanity check over a trie of its wordlist and leetspeak variants.
+
+    better_profanity rejects a message when a word, or a word joined with up
+    to max_joined following words, is in the wordlist. Words are joined
+    either directly ("as s" is "ass") or with the separators between them
+    ("hand job"). Like better_profanity, a one-character word that ends the
+    text is never joined.
+
+    Every message character may stand for several wordlist characters (e.g.
+    "4" for "a"), so the trie is walked with sets of trie nodes. Transitions
+    are memoized per (state, character), which turns it into a lazily built
+    DFA shared by every message.
+    """
+    MAX_CACHED_TRANSITIONS = 200_000
+
+    def __init__(self, words, chars_mapping: dict, max_joined: int):
+        self._children = [{}]
+        terminal = set()
+        for word in words:
+            node = 0
+            for char in word.lower():
+                child = self._children[node].get(char)
+                if child is None:
+                    child = len(self._children)
+                    self._children.append({})
+                    self._children[node][char] = child
+                node = child
+            terminal.add(node)
+        self._terminal = frozenset(terminal)
+        self._max_joined = max_joined
+
+        # Message character -> wordlist characters it may stand for
+        self._aliases = {}
+        for char, variants in chars_mapping.items():
+            for variant in variants:
+                self._aliases.setdefault(variant, {variant}).add(char)
+
+        self._root = frozenset([0])
+        self._transitions = {}
+
+    def _step(self, state: frozenset, char: str) -> frozenset:
+        key = (state, char)
+        next_state = self._transitions.get(key)
+        if next_state is None:
+            nodes = set()
+            for node in state:
+                children = self._children[node]
+                for alias in self._aliases.get(char, (char,)):
+                    child = children.get(alias)
+                    if child is not None:
+                        nodes.add(child)
+            next_state = frozenset(nodes)
+            if len(self._transitions) >= self.MAX_CACHED_TRANSITIONS:
+                self._transitions.clear()
+            self._transitions[key] = next_state
+        return next_state
+
+    def _walk(self, state: frozenset, text: str) -> frozenset:
+        for char in text:
+            if not state:
+                break
+            state = self._step(state, char)
+        return state
+
+    @staticmethod
+    def _words(text: str) -> list:
+        """(start index, word, separators before it) for every run of word characters."""
+        words = []
+        start = None
+        separator_start = 0
+        for index, char in enumerate(text):
+            if char in ALLOWED_CHARACTERS:
+                if start is None:
+                    start = index
+            elif start is not None:
+                words.append((start, text[start:index].lower(), text[separator_start:start].lower()))
+                start = None
+                separator_start = index
+        if start is not None:
+            words.append((start, text[start:].lower(), text[separator_start:start].lower()))
+        return words
+
+    def contains(self, text: str) -> bool:
+        words = self._words(text)
+        # better_profanity passes over text whose only word is one final character
+        if not words or words[0][0] >= len(text) - 1:
+            return False
+        for index, (_, word, _) in enumerate(words):
+            joined = spaced = self._walk(self._root, word)
+            if not joined.isdisjoint(self._terminal):
+                return True
+            for start, next_word, separator in words[index + 1:index + 1 + self._max_joined]:
+                if start >= len(text) - 1 or not (joined or spaced):
+                    break
+                joined = self._walk(joined, next_word)
+                spaced = self._walk(self._walk(spaced, separator), next_word)
+                if not joined.isdisjoint(self._terminal) or not spaced.isdisjoint(self._terminal):
+                    return True
+        return False
+
+
+_profanity_matcher = _ProfanityMatcher(
+    (str(word) for word in profanity.CENSOR_WORDSET), profanity.CHARS_MAPPING, profanity.MAX_NUMBER_COMBINATIONS
+)
+
+
+def failed_rule(message: str):
+    """Return the name of the first rule the message breaks, or None if it is valid."""
     if len(message.strip()) == 0:
-        raise ValueError("Message cannot be empty.")
-    if len(message) > 500:
-        raise ValueError("Message must be 500 characters or less.")
+        return "empty"
+    if len(message) > MAX_MESSAGE_LENGTH:
+        return "too_long"
     if is_characters_repeating(message):
-        raise ValueError("Message contains too many repeated characters.")
+        return "repeated_characters"
     if is_url(message):
-        raise ValueError("Message must not contain URL.")
-    if profanity.contains_profanity(message):
-        raise ValueError("Message contains bad words.")
+        return "url"
+    if contains_profanity(message):
+        return "profanity"
+    return None
 
+
+def validate_messages(messages) -> list:
+    """Batch form of failed_rule: one rule name or None per message."""
+    return [failed_rule(message) for message in messages]
+
+
+def is_message_valid(message: str) -> bool:
+    rule = failed_rule(message)
+    if rule is not None:
+        raise MessageRejected(rule)
     return True
 
 
 def is_url(message: str) -> bool:
-    url_regex = r"(https?://[^\s]+|www\.[^\s]+|[a-zA-Z0-9\-]+\.(com|org|net|io|gov|edu|co|ai)[^\s]*)"
-    return bool(re.search(url_regex, message))
+    return URL_REGEX.search(message) is not None
 
 
 def is_characters_repeating(message: str) -> bool:
-    repeating_char_regex = r"(.)\1{10,}"
-    return bool(re.search(repeating_char_regex, message))
+    return REPEATING_CHAR_REGEX.search(message) is not None
+
+
+def contains_profanity(message: str) -> bool:
+    return _profanity_matcher.contains(message)
@@ -1,22 +1,10 @@
-import textwrap
+from utils.layout import wrap_text
 
 
-def adjust_text_for_image(text, max_width=20, font=None, draw=None):
-    lines = []
+def adjust_text_for_image(text, max_width, font_size):
+    """Wrap text into lines no wider than max_width pixels at font_size.
 
-    # Step 1: Split manually where \n is present
-    paragraphs = text.split('\\n')  # Split at literal \n
-    paragraphs = [paragraph for paragraph in paragraphs if paragraph]
-
-    for paragraph in paragraphs:
-        # Step 2: Now wrap each paragraph separately
-        wrapped_lines = textwrap.wrap(paragraph, width=max_width)
-        for line in wrapped_lines:
-            original_line = line
-            while True:
-                bbox = draw.textbbox((0, 0), line, font=font)
-                if bbox[2] - bbox[0] <= max_width:
-                    break
-                line = line[:-1]  # Shrink until it fits
-            lines.append(original_line)
-    return lines
+    Paragraphs are split at literal \\n; glyph widths come from the cached
+    per-size advance tables in utils.layout, so this is linear in len(text).
+    """
+    return wrap_text(text, font_size, max_width)
@@ -0,0 +1,8 @@
+"""Load-test harness for backend-core and backend-image-generation.
+
+Starts each service against local stand-ins (a throwaway mongod when one is
+installed, otherwise an in-memory MongoDB; an in-memory bucket; a stub Slack
+webhook), drives mixed feed, like and submit traffic at a fixed concurrency
+and writes a JSON report per run. Run from the repository root:
+    python -m loadtest --concurrency 20 --duration 60
+"""
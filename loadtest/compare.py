@@ -0,0 +1,22 @@
+"""Compare two saved load-test reports: python -m loadtest.compare OLD.json NEW.json"""
+import json
+import sys
+
+from loadtest.run import compare
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print(__doc__)
+        return 2
+    reports = []
+    for path in argv:
+        with open(path) as f:
+            reports.append(json.load(f))
+    compare(*reports)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""In-memory stand-in for MongoDB, used when no mongod binary is available.
+
+Wraps a mongomock client in the subset of the pymongo sync and async APIs
+the services call. Every operation runs under one lock because the
+generation service uses the sync client from several threads. Change
+streams are reported as unsupported, so backend-core relies on its cache
+TTLs just as it does against a standalone mongod.
+"""
+import threading
+from types import SimpleNamespace
+
+import mongomock
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import OperationFailure
+
+_lock = threading.RLock()
+
+
+def _locked(method):
+    def call(*args, **kwargs):
+        with _lock:
+            return method(*args, **kwargs)
+    return call
+
+
+class FakeCursor:
+    """Lazy find(); the query runs, under the lock, when the cursor is iterated."""
+
+    def __init__(self, collection, args, kwargs):
+        self._collection = collection
+        self._args = args
+        self._kwargs = kwargs
+        self._chain = []
+
+    def _add(self, name, *args, **kwargs):
+        self._chain.append((name, args, kwargs))
+        return self
+
+    def sort(self, *args, **kwargs):
+        return self._add("sort", *args, **kwargs)
+
+    def limit(self, *args):
+        return self._add("limit", *args)
+
+    def skip(self, *args):
+        return self._add("skip", *args)
+
+    def batch_size(self, *args):
+        return self
+
+    def _fetch(self) -> list:
+        with _lock:
+            cursor = self._collection.find(*self._args, **self._kwargs)
+            for name, args, kwargs in self._chain:
+                cursor = getattr(cursor, name)(*args, **kwargs)
+            return list(cursor)
+
+    def __iter__(self):
+        return iter(self._fetch())
+
+    def to_list(self, length=None) -> list:
+        docs = self._fetch()
+        return docs if length is None else docs[:length]
+
+
+def _bulk_write(collection, requests, ordered: bool = True, **kwargs):
+    # mongomock's own bulk_write does not accept the operations of current pymongo versions
+    result = {"inserted_count": 0, "matched_count": 0, "modified_count": 0, "deleted_count": 0,
+              "upserted_count": 0, "upserted_ids": {}}
+    with _lock:
+        for index, op in enumerate(requests):
+            if isinstance(op, InsertOne):
+                collection.insert_one(op._doc)
+                result["inserted_count"] += 1
+                continue
+            if isinstance(op, (DeleteOne, DeleteMany)):
+                method = collection.delete_one if isinstance(op, DeleteOne) else collection.delete_many
+                result["deleted_count"] += method(op._filter).deleted_count
+                continue
+            if isinstance(op, ReplaceOne):
+                outcome = collection.replace_one(op._filter, op._doc, upsert=bool(op._upsert))
+            elif isinstance(op, (UpdateOne, UpdateMany)):
+                method = collection.update_one if isinstance(op, UpdateOne) else collection.update_many
+                outcome = method(op._filter, op._doc, upsert=bool(op._upsert))
+            else:
+                raise TypeError(f"Unsupported bulk operation: {op!r}")
+            result["matched_count"] += outcome.matched_count
+            result["modified_count"] += outcome.modified_count
+            if outcome.upserted_id is not None:
+                result["upserted_count"] += 1
+                result["upserted_ids"][index] = outcome.upserted_id
+    return SimpleNamespace(acknowledged=True, **result)
+
+
+class FakeCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs) -> FakeCursor:
+        return FakeCursor(self._collection, args, kwargs)
+
+    def bulk_write(self, requests, ordered: bool = True, **kwargs):
+        return _bulk_write(self._collection, requests, ordered)
+
+    def create_indexes(self, indexes, **kwargs):
+        # Index options such as partial filters are not all understood by mongomock, nor needed here
+        return [index.document["name"] for index in indexes]
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("Change streams are not supported by the in-memory stand-in", code=40573)
+
+    def __getattr__(self, name):
+        return _locked(getattr(self._collection, name))
+
+
+class FakeDatabase:
+    def __init__(self, database):
+        self._database = database
+        self._collections = {}
+
+    def __getitem__(self, name) -> FakeCollection:
+        with _lock:
+            if name not in self._collections:
+                self._collections[name] = FakeCollection(self._database[name])
+            return self._collections[name]
+
+    def __getattr__(self, name) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def command(self, command, *args, **kwargs) -> dict:
+        return {"ok": 1.0}
+
+
+class FakeClient:
+    def __init__(self, client=None):
+        self._client = client or mongomock.MongoClient()
+        self.admin = FakeDatabase(self._client.admin)
+
+    def __getitem__(self, name) -> FakeDatabase:
+        return FakeDatabase(self._client[name])
+
+    def close(self):
+        pass
+
+
+class AsyncFakeCursor:
+    def __init__(self, cursor: FakeCursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, *args):
+        self._cursor.limit(*args)
+        return self
+
+    def skip(self, *args):
+        self._cursor.skip(*args)
+        return self
+
+    def batch_size(self, *args):
+        return self
+
+    async def to_list(self, length=None) -> list:
+        return self._cursor.to_list(length)
+
+    async def __aiter__(self):
+        for doc in self._cursor._fetch():
+            yield doc
+
+
+class AsyncFakeCollection:
+    def __init__(self, collection: FakeCollection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs) -> AsyncFakeCursor:
+        return AsyncFakeCursor(self._collection.find(*args, **kwargs))
+
+    async def watch(self, *args, **kwargs):
+        return self._collection.watch(*args, **kwargs)
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+class AsyncFakeDatabase:
+    def __init__(self, database: FakeDatabase):
+        self._database = database
+
+    def __getitem__(self, name) -> AsyncFakeCollection:
+        return AsyncFakeCollection(self._database[name])
+
+    def __getattr__(self, name) -> AsyncFakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, command, *args, **kwargs) -> dict:
+        return self._database.command(command, *args, **kwargs)
+
+
+class AsyncFakeClient:
+    """Async view of a FakeClient; both see the same data."""
+
+    def __init__(self, client: FakeClient):
+        self._client = client
+        self.admin = AsyncFakeDatabase(client.admin)
+
+    def __getitem__(self, name) -> AsyncFakeDatabase:
+        return AsyncFakeDatabase(self._client[name])
+
+    async def close(self):
+        pass
+
+
+def install():
+    """Point shared.db's sync and async clients at one in-memory database."""
+    import shared.db
+
+    client = FakeClient()
+    shared.db._client = client
+    shared.db._async_client = AsyncFakeClient(client)
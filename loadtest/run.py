@@ -0,0 +1,330 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+from loadtest.serve import REPO_ROOT
+from loadtest.standins import SlackStub, free_port, start_mongod
+
+REPORT_DIR = os.path.join(REPO_ROOT, "loadtest", "reports")
+DEFAULT_MIX = "feed=6,like=3,submit=1"
+OK_STATUSES = {200, 202, 304}
+# Rate limit refusals are the service working as configured, so they are counted apart from errors
+THROTTLED_STATUSES = {429}
+WORDS = (
+    "the words we leave behind are quiet letters to a future we will never read "
+    "stay soft in a world that asks you to harden every morning brings another chance"
+).split()
+
+
+def _percentile(samples: list, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    """Latencies and outcomes per endpoint label; samples before start() are warm-up and dropped."""
+
+    def __init__(self):
+        self.recording = False
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.started = None
+        self.elapsed = 0.0
+
+    def start(self):
+        self.latencies.clear()
+        self.statuses.clear()
+        self.recording = True
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.recording = False
+        if self.started is not None:
+            self.elapsed = time.perf_counter() - self.started
+
+    def add(self, label: str, seconds: float, status):
+        if self.recording:
+            self.latencies[label].append(seconds)
+            self.statuses[label][str(status)] += 1
+
+    def _summary(self, latencies: list, statuses: Counter) -> dict:
+        # Exceptions are recorded by name, so anything not an OK or throttled status code is an error
+        throttled = sum(count for status, count in statuses.items()
+                        if status.isdigit() and int(status) in THROTTLED_STATUSES)
+        errors = sum(count for status, count in statuses.items()
+                     if not status.isdigit() or int(status) not in OK_STATUSES | THROTTLED_STATUSES)
+        requests = len(latencies) or 1  # only divides; an endpoint without samples reports zeros
+        return {
+            "requests": len(latencies),
+            "throughput_rps": round(len(latencies) / self.elapsed, 2) if self.elapsed > 0 else 0.0,
+            "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+            "error_rate": round(errors / requests, 4),
+            "throttled_rate": round(throttled / requests, 4),
+            "statuses": dict(sorted(statuses.items())),
+        }
+
+    def summary(self) -> dict:
+        endpoints = {
+            label: self._summary(latencies, self.statuses[label])
+            for label, latencies in sorted(self.latencies.items())
+        }
+        everything = [seconds for latencies in self.latencies.values() for seconds in latencies]
+        total = self._summary(everything, sum(self.statuses.values(), Counter())) if everything else {}
+        return {"endpoints": endpoints, "total": total}
+
+
+class VirtualUser:
+    """Closed loop: pick an action by weight, run it, repeat until the run ends."""
+
+    def __init__(self, client: httpx.AsyncClient, urls: dict, recorder: Recorder, mix: dict, known_ids: list,
+                 max_pages: int):
+        self.client = client
+        self.urls = urls
+        self.recorder = recorder
+        self.actions = [action for action in mix if action in self._available(urls)]
+        self.weights = [mix[action] for action in self.actions]
+        self.known_ids = known_ids
+        self.max_pages = max_pages
+        # Each user submits from its own address, as nginx would report it, for the per-client rate limit
+        self.headers = {"X-Real-IP": f"10.{random.randrange(256)}.{random.randrange(256)}.{random.randrange(1, 255)}"}
+
+    @staticmethod
+    def _available(urls: dict) -> set:
+        return ({"feed", "like"} if "core" in urls else set()) | ({"submit"} if "generate" in urls else set())
+
+    async def _request(self, label: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.add(label, time.perf_counter() - started, type(e).__name__)
+            return None
+        self.recorder.add(label, time.perf_counter() - started, response.status_code)
+        return response
+
+    async def feed(self):
+        sort = random.choice(["date", "likes"])
+        params = {"sort": sort}
+        for page in range(random.randint(1, self.max_pages)):
+            label = f"feed:{sort}" if page == 0 else f"feed:{sort}+cursor"
+            response = await self._request(label, "GET", f"{self.urls['core']}/api/core/images", params=params)
+            if response is None or response.status_code != 200:
+                return
+            body = response.json()
+            for image in body["images"]:
+                if len(self.known_ids) < 10_000:
+                    self.known_ids.append(image["submission_id"])
+            if "next_start_after_id" not in body:
+                return
+            params = {"sort": sort, "start_after_id": body["next_start_after_id"]}
+            if sort == "likes":
+                params["start_after_likes"] = body["next_start_after_likes"]
+
+    async def like(self):
+        if not self.known_ids:
+            return await self.feed()
+        action = "increase" if random.random() < 0.9 else "decrease"
+        params = {"submission_id": random.choice(self.known_ids), "like_action": action}
+        await self._request("like", "POST", f"{self.urls['core']}/api/core/like", params=params)
+
+    async def submit(self):
+        # Unique texts, so every submission is rendered rather than answered from the dedup cache
+        content = " ".join(random.choices(WORDS, k=random.randint(4, 40))) + f" #{random.getrandbits(32)}"
+        await self._request("submit", "POST", f"{self.urls['generate']}/api/generate/submit-message",
+                            json={"content": content}, headers=self.headers)
+
+    async def run(self, deadline: float):
+        while time.perf_counter() < deadline:
+            action = random.choices(self.actions, self.weights)[0]
+            await getattr(self, action)()
+
+
+def _parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        action, _, weight = part.partition("=")
+        if action not in ("feed", "like", "submit"):
+            raise argparse.ArgumentTypeError(f"unknown action '{action}'")
+        mix[action] = float(weight or 1)
+    return mix
+
+
+def _start_service(service: str, port: int, env: dict, fake_mongo: bool, seed: int, log) -> subprocess.Popen:
+    command = [sys.executable, "-m", "loadtest.serve", service, "--port", str(port)]
+    if fake_mongo:
+        command.append("--fake-mongo")
+    if seed:
+        command += ["--seed", str(seed)]
+    return subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def _wait_ready(url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+            await asyncio.sleep(0.25)
+
+
+async def drive(urls: dict, args) -> dict:
+    recorder = Recorder()
+    known_ids = []
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+        users = [VirtualUser(client, urls, recorder, args.mix, known_ids, args.max_pages)
+                 for _ in range(args.concurrency)]
+        deadline = time.perf_counter() + args.warmup + args.duration
+        tasks = [asyncio.create_task(user.run(deadline)) for user in users]
+        await asyncio.sleep(args.warmup)
+        recorder.start()
+        await asyncio.gather(*tasks)
+        recorder.stop()
+    return recorder.summary()
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(report: dict):
+    print(f"{'endpoint':<20}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'429s':>8}")
+    rows = list(report["endpoints"].items()) + [("total", report["total"])]
+    for label, stats in rows:
+        if stats:
+            print(f"{label:<20}{stats['requests']:>9}{stats['throughput_rps']:>9}{stats['p50_ms']:>9}"
+                  f"{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['error_rate']:>8.1%}"
+                  f"{stats.get('throttled_rate', 0):>8.1%}")
+
+
+def compare(old: dict, new: dict):
+    """Print throughput and p95 changes per endpoint between two reports."""
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'endpoint':<20}{'req/s':>18}{'p95 ms':>20}{'errors':>16}{'429s':>16}")
+    labels = sorted(set(old["endpoints"]) | set(new["endpoints"])) + ["total"]
+    for label in labels:
+        before = old["total"] if label == "total" else old["endpoints"].get(label)
+        after = new["total"] if label == "total" else new["endpoints"].get(label)
+        if not before or not after:
+            print(f"{label:<20}{'only in ' + ('new' if after else 'old'):>18}")
+            continue
+        rps = f"{before['throughput_rps']} -> {after['throughput_rps']}"
+        p95 = f"{before['p95_ms']} -> {after['p95_ms']}"
+        errors = f"{before['error_rate']:.1%} -> {after['error_rate']:.1%}"
+        throttled = f"{before.get('throttled_rate', 0):.1%} -> {after.get('throttled_rate', 0):.1%}"
+        print(f"{label:<20}{rps:>18}{p95:>20}{errors:>16}{throttled:>16}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description="Load-test the services locally.")
+    parser.add_argument("--services", default="core,generate", help="comma-separated: core, generate")
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=10, help="seconds of traffic before measuring")
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix(DEFAULT_MIX), help=f"action weights ({DEFAULT_MIX})")
+    parser.add_argument("--max-pages", type=int, default=5, help="feed pages a user follows per browse")
+    parser.add_argument("--seed", type=int, default=500, help="submissions inserted before the run")
+    parser.add_argument("--timeout", type=float, default=30, help="per-request timeout in seconds")
+    parser.add_argument("--rate-limits", action="store_true",
+                        help="keep the submission rate limits (off by default: all users share one machine)")
+    parser.add_argument("--fake-mongo", action="store_true", help="use the in-memory stand-in even if mongod exists")
+    parser.add_argument("--output", help="report path (default: loadtest/reports/<time>-<commit>.json)")
+    parser.add_argument("--compare", metavar="REPORT", help="print the change against an earlier report")
+    args = parser.parse_args(argv)
+
+    services = [service.strip() for service in args.services.split(",") if service.strip()]
+    output = args.output or os.path.join(
+        REPORT_DIR, f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{_git_commit()}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    mongod = None if args.fake_mongo else start_mongod()
+    slack = SlackStub()
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, ENVIRONMENT="loadtest", SLACK_WEBHOOK=slack.url,
+               SLACK_DIGEST_INTERVAL="1")
+    if not args.rate_limits:
+        # Each virtual user submits far more often than the per-client limit allows a real one
+        env.update(RATE_LIMIT_CLIENT_PER_MINUTE="0", RATE_LIMIT_GLOBAL_PER_SECOND="0")
+    if mongod is not None:
+        env.update(mongod.environment())
+
+    processes = []
+    logs = []
+    urls = {}
+    try:
+        for service in services:
+            port = free_port()
+            # With a shared mongod only core seeds; the in-memory stand-in is per process
+            seed = args.seed if service == "core" else 0
+            # Service output goes next to the report instead of interleaving with the results
+            logs.append(open(f"{os.path.splitext(output)[0]}.{service}.log", "w"))
+            processes.append(_start_service(service, port, env, mongod is None, seed, logs[-1]))
+            urls[service] = f"http://127.0.0.1:{port}"
+        for service, url in urls.items():
+            asyncio.run(_wait_ready(f"{url}/api/{service}/ready", timeout=120))
+
+        results = asyncio.run(drive(urls, args))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for log in logs:
+            log.close()
+        slack.close()
+        if mongod is not None:
+            mongod.close()
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "mongo": "mongod" if mongod is not None else "in-memory",
+        "config": {
+            "services": services,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "mix": args.mix,
+            "max_pages": args.max_pages,
+            "seed": args.seed,
+            "rate_limits": args.rate_limits,
+            "cpu_count": os.cpu_count(),
+        },
+        "slack_messages": slack.messages,
+        **results,
+    }
+    print_report(report)
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    return 0
@@ -0,0 +1,86 @@
+"""Run one service for a load test, with its external dependencies replaced.
+
+Started by the harness as a subprocess:
+    python -m loadtest.serve core --port 8001 --fake-mongo --seed 500
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_DIRS = {
+    "core": "backend-core",
+    "generate": "backend-image-generation",
+}
+
+
+def seed_submissions(count: int):
+    """Insert count feed-shaped submissions with a spread of likes and timestamps."""
+    from shared.db import get_db
+
+    now = datetime.utcnow()
+    docs = []
+    for i in range(count):
+        obj_id = ObjectId()
+        renditions = {
+            name: {
+                "url": f"https://minio.example/thumbnails/loadtest/{obj_id}-{name}.webp",
+                "key": f"loadtest/{obj_id}-{name}.webp",
+                "bytes": size,
+                "content_type": "image/webp",
+                "width": width,
+                "height": width,
+            }
+            for name, size, width in (("thumbnail", 12_000, 400), ("full", 90_000, 1080))
+        }
+        docs.append({
+            "_id": obj_id,
+            "thumbnail_url": renditions["thumbnail"]["url"],
+            "image_url": renditions["full"]["url"],
+            "renditions": renditions,
+            "object_keys": sorted(rendition["key"] for rendition in renditions.values()),
+            "timestamp": now - timedelta(minutes=count - i),
+            "likes": int(random.paretovariate(1.2)) - 1,  # a few popular posts, a long tail
+            "username": f"loadtest-{i}",
+        })
+    if docs:
+        get_db().submissions.insert_many(docs)
+    print(f"Seeded {count} submission(s)", file=sys.stderr)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m loadtest.serve")
+    parser.add_argument("service", choices=sorted(SERVICE_DIRS))
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--fake-mongo", action="store_true", help="use the in-memory MongoDB stand-in")
+    parser.add_argument("--seed", type=int, default=0, help="submissions to insert before serving")
+    args = parser.parse_args(argv)
+
+    # Services import their modules by bare name and load fonts and templates by relative path
+    service_dir = os.path.join(REPO_ROOT, SERVICE_DIRS[args.service])
+    os.chdir(service_dir)
+    sys.path[:0] = [service_dir, REPO_ROOT]
+
+    if args.fake_mongo:
+        from loadtest import fake_mongo
+        fake_mongo.install()
+    if args.seed:
+        seed_submissions(args.seed)
+    if args.service == "generate":
+        # The benchmarks' stand-in, so both harnesses upload the same way
+        from benchmarks.standins import use_memory_storage
+        use_memory_storage()
+
+    import uvicorn
+    from main import app
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level=os.getenv("LOADTEST_LOG_LEVEL", "warning"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
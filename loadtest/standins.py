@@ -0,0 +1,101 @@
+"""Local stand-ins for the services' external dependencies."""
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MONGO_USER = "loadtest"
+MONGO_PASSWORD = "loadtest"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class SlackStub:
+    """Answers Slack incoming-webhook posts with "ok" and counts them."""
+
+    def __init__(self):
+        self.messages = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stub.messages += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", free_port()), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/webhook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Mongod:
+    """Throwaway single-node replica set, so change streams work as in production."""
+
+    def __init__(self, binary: str):
+        self.dbpath = tempfile.mkdtemp(prefix="loadtest-mongod-")
+        self.port = free_port()
+        self.process = subprocess.Popen(
+            [binary, "--dbpath", self.dbpath, "--port", str(self.port), "--bind_ip", "127.0.0.1",
+             "--replSet", "rs0", "--quiet"],
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            self._initiate()
+        except Exception:
+            self.close()
+            raise
+
+    def _initiate(self):
+        from pymongo import MongoClient
+
+        client = MongoClient("127.0.0.1", self.port, directConnection=True, serverSelectionTimeoutMS=30000)
+        try:
+            client.admin.command("replSetInitiate", {"_id": "rs0", "members": [{"_id": 0, "host": f"127.0.0.1:{self.port}"}]})
+            deadline = time.monotonic() + 30
+            while not client.admin.command("hello").get("isWritablePrimary"):
+                if time.monotonic() > deadline:
+                    raise RuntimeError("mongod did not become primary")
+                time.sleep(0.2)
+            client.admin.command("createUser", MONGO_USER, pwd=MONGO_PASSWORD, roles=["root"])
+        finally:
+            client.close()
+
+    def environment(self) -> dict:
+        return {
+            "MONGO_HOST": "127.0.0.1",
+            "MONGO_PORT": str(self.port),
+            "MONGO_USER": MONGO_USER,
+            "MONGO_PASSWORD": MONGO_PASSWORD,
+        }
+
+    def close(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        shutil.rmtree(self.dbpath, ignore_errors=True)
+
+
+def start_mongod(binary: str = None):
+    """A Mongod on a free port, or None when no mongod binary is installed."""
+    binary = binary or os.getenv("MONGOD_BINARY") or shutil.which("mongod")
+    return Mongod(binary) if binary else None
@@ -0,0 +1,4 @@
+"""Code shared by backend-core, backend-image-generation and the admin backend.
+
+Each service image copies this package to /app/shared (see the service Dockerfiles).
+"""
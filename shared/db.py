@@ -0,0 +1,118 @@
+"""MongoDB settings and lazily created clients shared by all services.
+
+Nothing connects at import time: the first call to get_db() or
+get_async_db() builds the client, and the driver opens connections on the
+first operation. Pool size, timeouts and read preference are configured
+here for every service through MONGO_* environment variables.
+"""
+import os
+import threading
+
+import pymongo
+from pymongo import AsyncMongoClient, MongoClient
+
+from shared import metrics
+
+# Environment variables
+MONGO_HOST = os.getenv("MONGO_HOST", "mongo")
+MONGO_PORT = os.getenv("MONGO_PORT", "27017")
+MONGO_DB = os.getenv("MONGO_DB", "images")
+MONGO_USER = os.getenv("MONGO_USER", "mongo")
+MONGO_PASSWORD = os.getenv("MONGO_PASSWORD", "kenomuki")
+
+# Connection pool, timeout and read preference settings
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+# Readiness probes give up after this long, server selection included
+MONGO_PING_TIMEOUT_MS = int(os.getenv("MONGO_PING_TIMEOUT_MS", "1000"))
+
+# MongoDB connection URI
+MONGO_URI = f"mongodb://{MONGO_USER}:{MONGO_PASSWORD}@{MONGO_HOST}:{MONGO_PORT}/{MONGO_DB}?authSource=admin"
+
+_client = None
+_async_client = None
+_lock = threading.Lock()
+
+
+def client_options() -> dict:
+    return {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "readPreference": MONGO_READ_PREFERENCE,
+        "connect": False,
+        # Command latency and pool usage, exported at /metrics
+        "event_listeners": metrics.mongo_listeners(),
+    }
+
+
+def get_client() -> MongoClient:
+    """Synchronous client, created on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = MongoClient(MONGO_URI, **client_options())
+    return _client
+
+
+def get_db():
+    return get_client()[MONGO_DB]
+
+
+def get_async_client() -> AsyncMongoClient:
+    """Async client for event-loop services, created on first use."""
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = AsyncMongoClient(MONGO_URI, **client_options())
+    return _async_client
+
+
+def get_async_db():
+    return get_async_client()[MONGO_DB]
+
+
+def ping() -> bool:
+    """Readiness probe for the synchronous client."""
+    try:
+        with pymongo.timeout(MONGO_PING_TIMEOUT_MS / 1000):
+            get_client().admin.command("ping")
+        return True
+    except Exception:
+        return False
+
+
+async def ping_async() -> bool:
+    """Readiness probe for the async client."""
+    try:
+        with pymongo.timeout(MONGO_PING_TIMEOUT_MS / 1000):
+            await get_async_client().admin.command("ping")
+        return True
+    except Exception:
+        return False
+
+
+def close():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+async def close_async():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
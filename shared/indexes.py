@@ -0,0 +1,178 @@
+"""Index definitions for every collection, applied by each service at start-up.
+
+Run ``python -m shared.indexes`` to create the indexes, or
+``python -m shared.indexes --check`` to explain() every production query
+shape and fail if any of them scans the collection or sorts in memory.
+"""
+import logging
+import os
+import sys
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from shared.serializers import VISIBLE
+
+logger = logging.getLogger("uvicorn")
+
+# Finished jobs (done or failed) are deleted this long after finishing
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+# Slack outbox entries still to be delivered; delivered ones are removed and failed ones are kept
+# for inspection. Outbox queries must include this filter to use the partial index below.
+UNDELIVERED = {"notification.status": {"$in": ["pending", "sending"]}}
+
+# collection name -> indexes it must have; create_indexes is a no-op for existing ones
+INDEXES = {
+    "submissions": [
+        # Feed sorted by likes, _id is the tiebreaker and keyset cursor
+        IndexModel([("likes", DESCENDING), ("_id", DESCENDING)], name="likes_desc_id_desc"),
+        IndexModel([("timestamp", DESCENDING)], name="timestamp_desc"),
+        # Moderation selects a user's submissions within a time range
+        IndexModel([("username", ASCENDING), ("timestamp", DESCENDING)], name="username_timestamp_desc"),
+        # Storage reconciler looks up which listed objects are still referenced
+        IndexModel([("object_keys", ASCENDING)], name="object_keys"),
+        # Content-addressed dedup of renders; older submissions have no hash
+        IndexModel([("render_hash", ASCENDING)], name="render_hash", unique=True, sparse=True),
+        # Slack outbox entries embedded in submissions; only undelivered ones are indexed
+        IndexModel(
+            [("notification.status", ASCENDING), ("notification.next_attempt_at", ASCENDING)],
+            name="notification_status_next_attempt", partialFilterExpression=UNDELIVERED
+        ),
+        # Only set while a dispatcher holds the entry, which reads its batch back in _id order
+        IndexModel(
+            [("notification.claimed_by", ASCENDING), ("_id", ASCENDING)], name="notification_claimed_by_id",
+            sparse=True
+        ),
+    ],
+    "jobs": [
+        # Job claims: both branches of the $or walk status in created_at order, lease checked from the key
+        IndexModel(
+            [("status", ASCENDING), ("created_at", ASCENDING), ("lease_until", ASCENDING)],
+            name="status_created_at_lease_until"
+        ),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease_until"),
+        # Only finished jobs have finished_at, so only they expire
+        IndexModel([("finished_at", ASCENDING)], name="finished_at_ttl", expireAfterSeconds=JOB_RETENTION_SECONDS),
+    ],
+}
+
+_SAMPLE_ID = ObjectId()
+
+# Query shapes run in production: (name, collection, filter, sort, limit)
+QUERY_SHAPES = [
+    ("feed by date, first page", "submissions", {**VISIBLE}, [("_id", DESCENDING)], 5),
+    ("feed by date, next page", "submissions", {**VISIBLE, "_id": {"$lt": _SAMPLE_ID}}, [("_id", DESCENDING)], 5),
+    ("feed by likes, first page", "submissions", {**VISIBLE}, [("likes", DESCENDING), ("_id", DESCENDING)], 5),
+    ("feed by likes, next page", "submissions", {
+        **VISIBLE,
+        "$or": [
+            {"likes": {"$lt": 3}},
+            {"likes": 3, "_id": {"$lt": _SAMPLE_ID}}
+        ]
+    }, [("likes", DESCENDING), ("_id", DESCENDING)], 5),
+    ("submission by id", "submissions", {"_id": _SAMPLE_ID}, None, 1),
+    ("submissions by ids", "submissions", {"_id": {"$in": [_SAMPLE_ID, ObjectId()]}, **VISIBLE}, None, 5),
+    ("moderation by username and time", "submissions", {
+        "username": "quiet_soul",
+        "timestamp": {"$gte": _SAMPLE_ID.generation_time}
+    }, None, 5000),
+    ("submissions by object keys", "submissions", {"object_keys": {"$in": ["a-full.webp", "b-full.webp"]}}, None, 1000),
+    ("submission by render hash", "submissions", {"render_hash": "0" * 32}, None, 1),
+    ("job claim", "jobs", {
+        "$or": [
+            {"status": "queued"},
+            {"status": "running", "lease_until": {"$lt": _SAMPLE_ID.generation_time}, "attempts": {"$lt": 3}}
+        ]
+    }, [("created_at", ASCENDING)], 1),
+    ("queued job count", "jobs", {"status": "queued"}, None, 0),
+    ("abandoned jobs", "jobs", {
+        "status": "running",
+        "lease_until": {"$lt": _SAMPLE_ID.generation_time},
+        "attempts": {"$gte": 3}
+    }, None, 0),
+    ("due notifications", "submissions", {
+        **UNDELIVERED,
+        "notification.next_attempt_at": {"$lte": _SAMPLE_ID.generation_time}
+    }, [("notification.next_attempt_at", ASCENDING)], 50),
+    ("claimed notifications", "submissions", {"notification.claimed_by": "0" * 32}, [("_id", ASCENDING)], 0),
+]
+
+# Plan stages that mean a query reads every document or sorts without an index
+_BAD_STAGES = {"COLLSCAN", "SORT"}
+
+
+def _log_conflict(collection: str, error: OperationFailure):
+    # An index with the same keys but other options or name already exists; leave it alone
+    logger.warning(f"Index on '{collection}' not created: {error.details.get('errmsg', str(error))}")
+
+
+def ensure_indexes(db):
+    """Create all indexes using a synchronous pymongo Database."""
+    for collection, models in INDEXES.items():
+        try:
+            db[collection].create_indexes(models)
+        except OperationFailure as e:
+            _log_conflict(collection, e)
+
+
+async def ensure_indexes_async(db):
+    """Create all indexes using an AsyncMongoClient Database."""
+    for collection, models in INDEXES.items():
+        try:
+            await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            _log_conflict(collection, e)
+
+
+def _plan_stages(plan: dict):
+    """Yield every stage name in an explain() plan tree."""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan", "outerStage", "innerStage"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+def check_query_plans(db) -> list:
+    """Explain every shape in QUERY_SHAPES; return (name, bad stages) for failing ones."""
+    failures = []
+    for name, collection, query_filter, sort, limit in QUERY_SHAPES:
+        command = {"find": collection, "filter": query_filter, "limit": limit}
+        if sort:
+            command["sort"] = dict(sort)
+        explained = db.command("explain", command, verbosity="queryPlanner")
+        stages = set(_plan_stages(explained["queryPlanner"]["winningPlan"]))
+        bad = stages & _BAD_STAGES
+        if bad:
+            failures.append((name, sorted(bad)))
+    return failures
+
+
+def main(argv=None) -> int:
+    from shared.db import get_db
+
+    argv = sys.argv[1:] if argv is None else argv
+    db = get_db()
+
+    ensure_indexes(db)
+    print("Indexes ensured.")
+    if "--check" not in argv:
+        return 0
+
+    failures = check_query_plans(db)
+    for name, stages in failures:
+        print(f"FAIL {name}: {', '.join(stages)}")
+    if failures:
+        return 1
+    print(f"All {len(QUERY_SHAPES)} query shapes use indexes.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""Prometheus metrics shared by all services.
+
+instrument(app) records latency per route and requests in flight, and serves
+everything at /metrics, outside the public /api prefix. MongoDB commands and
+pool usage are recorded by listeners that shared.db installs on every
+client; services time their own stages and MinIO calls with time_stage()
+and time_storage().
+
+With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory so /metrics aggregates all of them.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from pymongo import monitoring
+from starlette.responses import Response
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# From a cached feed page (a few ms) to a render under load (tens of seconds)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTE_BUCKETS = tuple(2 ** power for power in range(12, 25))  # 4 KiB to 16 MiB
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being handled",
+    ["method"], multiprocess_mode="livesum"
+)
+
+STAGE_LATENCY = Histogram(
+    "submission_stage_duration_seconds", "Time spent in each submission stage",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+OUTPUT_BYTES = Histogram(
+    "submission_output_bytes", "Encoded size of each uploaded rendition",
+    ["rendition"], buckets=BYTE_BUCKETS
+)
+SUBMISSIONS_REFUSED = Counter(
+    "submissions_refused", "Submissions refused before any work by rate limits or admission control", ["reason"]
+)
+RENDER_QUEUE_DEPTH = Gauge(
+    "render_queue_depth", "Renders running or waiting on the render pool", multiprocess_mode="livesum"
+)
+RENDER_POOL_REBUILDS = Counter(
+    "render_pool_rebuilds", "Render pools replaced after a worker process died"
+)
+
+LIVE_FEED_CLIENTS = Gauge(
+    "live_feed_clients", "Clients connected to the live feed stream", multiprocess_mode="livesum"
+)
+LIVE_FEED_RESYNCS = Counter(
+    "live_feed_resyncs", "Live feed clients that fell too far behind and were told to reload"
+)
+
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency",
+    ["command", "outcome"], buckets=LATENCY_BUCKETS
+)
+MONGO_CONNECTIONS = Gauge(
+    "mongodb_pool_connections", "Open connections in the driver pools", multiprocess_mode="livesum"
+)
+MONGO_CONNECTIONS_IN_USE = Gauge(
+    "mongodb_pool_connections_in_use", "Connections checked out of the driver pools", multiprocess_mode="livesum"
+)
+MONGO_CHECKOUT_LATENCY = Histogram(
+    "mongodb_pool_checkout_duration_seconds", "Time spent waiting for a pooled connection",
+    buckets=LATENCY_BUCKETS
+)
+MONGO_CHECKOUT_FAILURES = Counter(
+    "mongodb_pool_checkout_failures", "Connection checkouts that failed", ["reason"]
+)
+
+STORAGE_LATENCY = Histogram(
+    "storage_operation_duration_seconds", "MinIO request latency",
+    ["operation", "outcome"], buckets=LATENCY_BUCKETS
+)
+STORAGE_IN_PROGRESS = Gauge(
+    "storage_requests_in_progress", "MinIO requests in flight, each holding an HTTP pool connection",
+    ["operation"], multiprocess_mode="livesum"
+)
+
+
+@contextmanager
+def time_stage(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def time_storage(operation: str):
+    in_progress = STORAGE_IN_PROGRESS.labels(operation)
+    in_progress.inc()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        in_progress.dec()
+        STORAGE_LATENCY.labels(operation, outcome).observe(time.perf_counter() - started)
+
+
+class _CommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name, "ok").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name, "error").observe(event.duration_micros / 1e6)
+
+
+class _PoolMetrics(monitoring.ConnectionPoolListener):
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_CONNECTIONS.inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_CONNECTIONS.dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_CHECKOUT_FAILURES.labels(event.reason).inc()
+
+    def connection_checked_out(self, event):
+        MONGO_CONNECTIONS_IN_USE.inc()
+        duration = getattr(event, "duration", None)  # reported since pymongo 4.7
+        if duration is not None:
+            MONGO_CHECKOUT_LATENCY.observe(duration)
+
+    def connection_checked_in(self, event):
+        MONGO_CONNECTIONS_IN_USE.dec()
+
+
+def mongo_listeners() -> list:
+    """Event listeners for MongoClient(event_listeners=...)."""
+    return [_CommandMetrics(), _PoolMetrics()]
+
+
+def _route_of(scope) -> str:
+    # The router records the matched route; its template keeps the label set bounded
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        # The route is only known once the router has run, so requests in flight are counted per method
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            REQUEST_LATENCY.labels(method, _route_of(scope), str(status)).observe(time.perf_counter() - started)
+
+
+async def metrics_endpoint() -> Response:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def instrument(app):
+    """Record every request of app and serve the metrics at /metrics."""
+    app.add_middleware(MetricsMiddleware)
+    app.add_api_route("/metrics", metrics_endpoint, include_in_schema=False)
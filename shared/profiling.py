@@ -0,0 +1,176 @@
+"""Opt-in sampling profiler for live requests.
+
+A request is profiled with pyinstrument when it carries
+"X-Profile: <PROFILING_TOKEN>" or falls inside PROFILING_SAMPLE_RATE. Each
+profile is stored under PROFILING_DIR as an HTML flame view and a
+collapsed-stack file (for flamegraph.pl or speedscope), named by the
+request id returned in the X-Profile-Id response header. <prefix>/profiles
+lists them and <prefix>/profiles/{id} downloads one, under the service's API
+prefix; both need the token in X-Profile. nginx only forwards them from the
+internal network.
+
+Work done in other processes, such as the image generator's render pool,
+shows up only as time spent waiting. With neither a token nor a sample rate
+configured, instrument() adds nothing to the app.
+"""
+import asyncio
+import hmac
+import logging
+import os
+import random
+import re
+import time
+import uuid
+
+from fastapi import Header, HTTPException
+from fastapi.responses import FileResponse
+from pyinstrument import Profiler
+
+logger = logging.getLogger("uvicorn")
+
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_DIR = os.getenv("PROFILING_DIR", "/tmp/profiles")
+PROFILING_INTERVAL = float(os.getenv("PROFILING_INTERVAL", "0.001"))
+# Oldest profiles are deleted beyond this many
+PROFILING_MAX_PROFILES = int(os.getenv("PROFILING_MAX_PROFILES", "200"))
+
+FORMATS = {
+    "html": ("html", "text/html"),
+    "collapsed": ("collapsed.txt", "text/plain"),
+}
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_PROFILE_ID = re.compile(r"^[0-9]+-[A-Za-z0-9_-]{1,64}$")
+
+
+def enabled() -> bool:
+    return bool(PROFILING_TOKEN) or PROFILING_SAMPLE_RATE > 0
+
+
+def _authorized(token) -> bool:
+    return bool(PROFILING_TOKEN) and token is not None and hmac.compare_digest(token, PROFILING_TOKEN)
+
+
+def _request_id(headers: dict) -> str:
+    # Reuse the caller's id when it is safe to put in a file name
+    request_id = headers.get(b"x-request-id", b"").decode("latin-1")
+    if not _REQUEST_ID.match(request_id):
+        request_id = uuid.uuid4().hex
+    # Millisecond prefix, so ids sort by time
+    return f"{int(time.time() * 1000)}-{request_id}"
+
+
+def _collapsed(frame, stack: tuple, lines: list):
+    name = frame.function
+    if frame.file_path_short:
+        location = f"{frame.file_path_short}:{frame.line_no}" if frame.line_no else frame.file_path_short
+        name = f"{name} ({location})"
+    stack = stack + (name.replace(";", ":"),)
+    child_time = sum(child.time for child in frame.children)
+    self_micros = round((frame.time - child_time) * 1e6)
+    if self_micros > 0:
+        lines.append(f"{';'.join(stack)} {self_micros}")
+    for child in frame.children:
+        _collapsed(child, stack, lines)
+
+
+def _save(profiler: Profiler, profile_id: str, path: str):
+    os.makedirs(PROFILING_DIR, exist_ok=True)
+    base = os.path.join(PROFILING_DIR, profile_id)
+    with open(f"{base}.html", "w") as f:
+        f.write(profiler.output_html())
+
+    lines = [f"# {path}"]
+    root = profiler.last_session.root_frame()
+    if root is not None:
+        _collapsed(root, (), lines)
+    with open(f"{base}.collapsed.txt", "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+    # Keep the newest PROFILING_MAX_PROFILES
+    profile_ids = sorted(list_profiles(), reverse=True)
+    for stale in profile_ids[PROFILING_MAX_PROFILES:]:
+        for extension, _ in FORMATS.values():
+            try:
+                os.remove(os.path.join(PROFILING_DIR, f"{stale}.{extension}"))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> list:
+    try:
+        names = os.listdir(PROFILING_DIR)
+    except FileNotFoundError:
+        return []
+    return [name[:-len(".html")] for name in names if name.endswith(".html")]
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, profiles_path: str = "/profiles"):
+        self.app = app
+        self.profiles_path = profiles_path
+
+    async def __call__(self, scope, receive, send):
+        # The listing endpoints take the same header and are never worth profiling
+        if scope["type"] != "http" or scope["path"].startswith(self.profiles_path):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        token = headers.get(b"x-profile")
+        requested = token is not None and _authorized(token.decode("latin-1"))
+        if not requested and not (PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = _request_id(headers)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        profiler = Profiler(interval=PROFILING_INTERVAL, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.stop()
+            try:
+                await asyncio.to_thread(_save, profiler, profile_id, f"{scope['method']} {scope['path']}")
+            except Exception as e:
+                logger.error(f"Failed to save profile {profile_id}: {str(e)}")
+
+
+def _check_token(x_profile: str):
+    if not _authorized(x_profile):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+
+async def get_profiles(x_profile: str = Header(None)):
+    _check_token(x_profile)
+    return {"profiles": sorted(list_profiles(), reverse=True)}
+
+
+async def get_profile(profile_id: str, format: str = "html", x_profile: str = Header(None)):
+    _check_token(x_profile)
+    if format not in FORMATS or not _PROFILE_ID.match(profile_id):
+        raise HTTPException(status_code=400, detail="Invalid profile id or format")
+    extension, media_type = FORMATS[format]
+    path = os.path.join(PROFILING_DIR, f"{profile_id}.{extension}")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type=media_type, filename=f"{profile_id}.{extension}")
+
+
+def instrument(app, prefix: str):
+    """Profile opted-in requests of app and serve the profiles at <prefix>/profiles; a no-op when disabled."""
+    if not enabled():
+        return
+    profiles_path = f"{prefix}/profiles"
+    app.add_middleware(ProfilingMiddleware, profiles_path=profiles_path)
+    if PROFILING_TOKEN:
+        app.add_api_route(profiles_path, get_profiles, methods=["GET"], include_in_schema=False)
+        app.add_api_route(f"{profiles_path}/{{profile_id}}", get_profile, methods=["GET"], include_in_schema=False)
+    logger.info(f"Request profiling enabled, sample rate {PROFILING_SAMPLE_RATE}, profiles in {PROFILING_DIR}")
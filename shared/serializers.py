@@ -0,0 +1,44 @@
+"""Compact conversion of submission documents into feed rows."""
+import orjson
+
+# Fields each feed returns; also used as the Mongo projection so nothing else is transferred
+CORE_FEED_FIELDS = ("thumbnail_url", "image_url", "renditions", "timestamp", "likes", "username")
+ADMIN_FEED_FIELDS = ("thumbnail_url", "image_url", "timestamp", "likes", "username", "hidden")
+
+# Submissions hidden by moderators stay in the collection but out of public feeds
+VISIBLE = {"hidden": {"$ne": True}}
+
+_DEFAULTS = {
+    "thumbnail_url": "",
+    "renditions": {},
+    "likes": 0,
+    "username": "unknown",
+    "hidden": False,
+}
+
+
+def projection(fields) -> dict:
+    return {field: 1 for field in fields}
+
+
+def serialize_submission(doc: dict, fields) -> dict:
+    """Feed row for a projected submission document.
+
+    Datetimes are left as-is; orjson writes them in ISO 8601.
+    """
+    row = {"submission_id": str(doc["_id"])}
+    for field in fields:
+        value = doc.get(field)
+        if field == "image_url" and not value:
+            # Older submissions only stored the thumbnail
+            value = doc.get("thumbnail_url", "")
+        elif field == "timestamp" and not value:
+            value = ""
+        elif value is None:
+            value = _DEFAULTS.get(field, "")
+        row[field] = value
+    return row
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content)
@@ -0,0 +1,59 @@
+"""Anonymous display names given to new submissions."""
+import random
+
+ANONYMOUS_ALTERNATIVES = [
+    "someone_like_you",
+    "quiet_soul",
+    "passing_thought",
+    "unknown_voice",
+    "from_the_void",
+    "left_unsaid",
+    "hidden_whisper",
+    "fleeting_echo",
+    "silent_presence",
+    "unseen_heart",
+    "secret_mind",
+    "wandering_voice",
+    "unspoken_truth",
+    "echo_in_the_dark",
+    "shadowed_words",
+    "forgotten_whisper",
+    "veiled_thought",
+    "unknown_presence",
+    "quiet_whisperer",
+    "unheard_soul",
+    "hidden_whisperer",
+    "unnoticed_thought",
+    "lost_voice",
+    "shadowy_mind",
+    "soft_echo",
+    "unseen_whisper",
+    "hidden_echo",
+    "passing_whisper",
+    "silent_thought",
+    "veiled_echo",
+    "unknown_murmur",
+    "secret_echo",
+    "wandering_mind",
+    "quiet_murmur",
+    "echo_of_silence",
+    "unnoticed_echo",
+    "shadow_whisper",
+    "unvoiced_message",
+    "subtle_presence",
+    "secret_whisperer",
+    "silent_whisper",
+    "unseen_echo",
+    "unknown_whisperer",
+    "quiet_signal",
+    "ghostly_message",
+    "elusive_voice",
+    "shadowed_echo",
+    "unseen_murmur",
+    "whispered_thought",
+    "quiet_echo"
+]
+
+
+def random_username() -> str:
+    return random.choice(ANONYMOUS_ALTERNATIVES)